@@ -3,14 +3,19 @@ from flask_cors import CORS
 import json
 import os
 import uuid
+import base64
+import threading
 import datetime
 from dotenv import load_dotenv
+from pymongo import ReplaceOne
+from werkzeug.exceptions import RequestEntityTooLarge
 
 load_dotenv()
 
 from gemini import analyze_lab_report, chat_with_context
-from ocr import extract_text_from_image
-from severity import calculate_risk_level
+from ocr import extract_report_text, ocr_cache_stats, ocr_preprocess_stats, ocr_source_counts
+from severity import calculate_risk_level, apply_ai_risk
+from report_log import ReportLog
 
 app = Flask(__name__)
 
@@ -20,88 +25,256 @@ CORS(app, resources={r"/api/*": {"origins": allowed_origins}}, supports_credenti
 # Also apply to other routes if needed
 CORS(app) 
 
-import pymongo
-from pymongo import MongoClient
+from mongo_client import get_db, connect_in_background
+from write_behind import MONGO_WRITE_BEHIND, WriteBehindQueue
+from uploads import UPLOAD_DIR, MAX_UPLOAD_BYTES, UploadTooLarge, stream_to_disk
+
+# Reject oversized bodies before Werkzeug spools them (slack for multipart headers);
+# stream_to_disk enforces the exact limit on the file itself
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 64 * 1024
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    # Same JSON body as stream_to_disk's UploadTooLarge, instead of Werkzeug's HTML page
+    return jsonify({"error": f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit"}), 413
 
 REPORTS_FILE = 'reports.json'
-MONGO_URI = os.getenv("MONGO_URI")
-MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "cortex_lmh")
+REPORTS_LOG_FILE = 'reports.jsonl'  # single-file log from before segmentation
+REPORTS_LOG_DIR = 'reports_log'
+REPORT_SUMMARIES_DIR = 'report_summaries'
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 200
+SUMMARY_BACKFILL_BATCH = 500
+# Lightweight projection served to list views with ?view=summary
+HISTORY_SUMMARY_FIELDS = ('id', 'filename', 'reportType', 'overallRisk', 'abnormalCount', 'createdAt')
 
-# Initialize MongoDB
-db_client = None
+# MongoDB (shared, pooled client; falls back to local JSON when unavailable) connects
+# on a background thread so a slow or unreachable cluster doesn't hold up worker boot;
+# init_storage() attaches it before the first request that touches reports
+connect_in_background()
+db = None
 reports_collection = None
+# Materialized summaries written alongside each report; list views read only these
+summaries_collection = None
+# Optional write-behind buffering of report inserts (MONGO_WRITE_BEHIND=true)
+report_writer = None
+summary_writer = None
+storage_ready = False
+_storage_lock = threading.Lock()
+
+# Local fallback: segmented append-only log, migrated once from the legacy files
+report_log = ReportLog(REPORTS_LOG_DIR, legacy_paths=(REPORTS_LOG_FILE, REPORTS_FILE))
+summary_log = ReportLog(REPORT_SUMMARIES_DIR)
+
+def init_storage():
+    """Wait for the background MongoDB connection attempt once, then wire up collections."""
+    global db, reports_collection, summaries_collection, report_writer, summary_writer, storage_ready
+    if storage_ready:
+        return
+    with _storage_lock:
+        if storage_ready:
+            return
+        db = get_db()
+        if db is not None:
+            reports_collection = db['reports']
+            summaries_collection = db['report_summaries']
+            if MONGO_WRITE_BEHIND:
+                # Reports MongoDB refuses are kept in the local log instead of being lost
+                report_writer = WriteBehindQueue(reports_collection, on_reject=report_log.append)
+                summary_writer = WriteBehindQueue(summaries_collection, on_reject=summary_log.append)
+        threading.Thread(target=backfill_summaries, daemon=True).start()
+        storage_ready = True
+
+@app.before_request
+def ensure_storage():
+    # /health answers right away, even while MongoDB is still connecting
+    if request.endpoint != 'health':
+        init_storage()
+
+def encode_cursor(created_at, report_id):
+    raw = json.dumps([created_at, report_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
 
-if MONGO_URI:
+def decode_cursor(cursor):
+    """Returns (createdAt, id) or None for a missing/malformed cursor."""
+    if not cursor:
+        return None
     try:
-        db_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-        # Force a connection check
-        db_client.server_info()
-        db = db_client[MONGO_DB_NAME]
-        reports_collection = db['reports']
-        print(f"✅ Connected to MongoDB Atlas: {MONGO_DB_NAME}")
-    except Exception as e:
-        print(f"⚠️ MongoDB Connection failed: {e}. Falling back to local JSON.")
+        created_at, report_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(created_at), str(report_id)
+    except (ValueError, TypeError):
+        return None
 
-def get_all_reports():
-    """Fetch all reports from MongoDB or local JSON fallback."""
-    if reports_collection is not None:
+def summarize_report(report):
+    """Project a stored report onto HISTORY_SUMMARY_FIELDS."""
+    summary = {field: report.get(field) for field in HISTORY_SUMMARY_FIELDS}
+    risk_summary = report.get('riskSummary') or {}
+    if summary['overallRisk'] is None:
+        summary['overallRisk'] = risk_summary.get('overallRisk')
+    if summary['abnormalCount'] is None:
+        summary['abnormalCount'] = risk_summary.get('abnormalCount')
+    return summary
+
+def backfill_summaries():
+    """
+    Materialize summaries for every report that has none (e.g. saved before
+    the summary store existed, or while it was unavailable), in batches.
+    Runs on a background thread; both workers may run it, which only
+    rewrites identical summaries.
+    """
+    backfilled = 0
+    if summaries_collection is not None:
         try:
-            return list(reports_collection.find({}, {'_id': 0}).sort('createdAt', -1))
+            have = {s['id'] for s in summaries_collection.find({}, {'_id': 0, 'id': 1}) if 'id' in s}
+            projection = {'_id': 0, 'id': 1, 'filename': 1, 'reportType': 1, 'createdAt': 1,
+                          'riskSummary.overallRisk': 1, 'riskSummary.abnormalCount': 1}
+            batch = []
+            for report in reports_collection.find({}, projection).batch_size(SUMMARY_BACKFILL_BATCH):
+                if report.get('id') in have:
+                    continue
+                summary = summarize_report(report)
+                batch.append(ReplaceOne({"id": summary['id']}, summary, upsert=True))
+                if len(batch) >= SUMMARY_BACKFILL_BATCH:
+                    summaries_collection.bulk_write(batch, ordered=False)
+                    backfilled += len(batch)
+                    batch = []
+            if batch:
+                summaries_collection.bulk_write(batch, ordered=False)
+                backfilled += len(batch)
         except Exception as e:
-            print(f"Error reading from MongoDB: {e}")
-    
+            print(f"⚠️ Could not backfill report summaries: {e}")
+    else:
+        missing = sorted(report_log.ids() - summary_log.ids())
+        for start in range(0, len(missing), SUMMARY_BACKFILL_BATCH):
+            reports = report_log.get_many(missing[start:start + SUMMARY_BACKFILL_BATCH])
+            summary_log.append_many([summarize_report(r) for r in reports])
+            backfilled += len(reports)
+    if backfilled:
+        print(f"✓ Backfilled {backfilled} report summaries")
+
+def get_reports_page(limit, cursor=None, summary_only=False):
+    """
+    Newest-first page of reports keyed on (createdAt, id).
+    Summary pages are read from the materialized summary store.
+    Returns: (reports, next_cursor)
+    """
+    collection = summaries_collection if summary_only else reports_collection
+    if collection is not None:
+        try:
+            query = {}
+            if cursor:
+                created_at, report_id = cursor
+                query = {"$or": [
+                    {"createdAt": {"$lt": created_at}},
+                    {"createdAt": created_at, "id": {"$lt": report_id}},
+                ]}
+            docs = list(
+                collection.find(query, {'_id': 0})
+                .sort([('createdAt', -1), ('id', -1)])
+                .limit(limit + 1)
+            )
+            has_more = len(docs) > limit
+            docs = docs[:limit]
+            next_cursor = (docs[-1].get('createdAt'), docs[-1].get('id')) if has_more else None
+            return docs, next_cursor
+        except Exception as e:
+            print(f"Error paging reports from MongoDB: {e}")
+
     # Fallback to local JSON
-    if os.path.exists(REPORTS_FILE):
-         with open(REPORTS_FILE, 'r') as f:
-            try: return json.load(f)
-            except: return []
-    return []
+    return (summary_log if summary_only else report_log).page(limit, cursor)
 
 def save_report_data(data):
-    """Save report to MongoDB or local JSON fallback."""
+    """Save report (and its list-view summary) to MongoDB or local JSON fallback."""
+    summary = summarize_report(data)
     if reports_collection is not None:
         try:
+            if report_writer is not None:
+                report_writer.put(data.copy())
+                summary_writer.put(summary)
+                print(f"✓ Report queued for MongoDB Atlas")
+                return True
             reports_collection.insert_one(data.copy())
             print(f"✓ Report saved to MongoDB Atlas")
+            save_summary(summary)
             return True
         except Exception as e:
             print(f"Error saving to MongoDB: {e}")
 
     # Fallback to local JSON
     try:
-        reports = []
-        if os.path.exists(REPORTS_FILE):
-            with open(REPORTS_FILE, 'r') as f:
-                reports = json.load(f)
-        reports.append(data)
-        with open(REPORTS_FILE, 'w') as f:
-            json.dump(reports, f, indent=4)
-        return True
+        saved = report_log.append(data)
+        summary_log.append(summary)
+        return saved
     except Exception as e:
         print(f"Error saving report locally: {e}")
         return False
 
+def save_summary(summary):
+    """Upsert a summary; a missing summary only hides the report from list views."""
+    try:
+        summaries_collection.replace_one({"id": summary['id']}, summary.copy(), upsert=True)
+    except Exception as e:
+        print(f"⚠️ Could not save report summary: {e}")
+
 def get_report_by_id(report_id):
     """Retrieve a single report by ID."""
+    if report_writer is not None:
+        pending = report_writer.get(report_id)
+        if pending is not None:
+            return pending
     if reports_collection is not None:
         try:
-            return reports_collection.find_one({"id": report_id}, {'_id': 0})
+            report = reports_collection.find_one({"id": report_id}, {'_id': 0})
+            if report is not None:
+                return report
         except Exception as e:
             print(f"Error finding report in MongoDB: {e}")
 
-    # Fallback to local JSON
-    reports = get_all_reports()
-    return next((r for r in reports if r.get('id') == report_id), None)
+    # Fallback to local JSON (also holds reports MongoDB rejected)
+    return report_log.get(report_id)
 
 
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({"status": "healthy", "team": "Cortex LMH"})
+    return jsonify({
+        "status": "healthy",
+        "team": "Cortex LMH",
+        "ocrCache": ocr_cache_stats(),
+        "ocrPreprocess": ocr_preprocess_stats(),
+        "ocrSources": ocr_source_counts(),
+    })
 
 @app.route('/api/history', methods=['GET'])
 def get_history():
-    reports = get_all_reports()
-    return jsonify({"success": True, "data": reports[::-1]})
+    """
+    Report history, newest first.
+    Query params: limit, cursor (from the previous page's nextCursor), view=full|summary
+    Without limit or cursor the whole history is returned (nextCursor is null),
+    as clients that don't paginate expect.
+    """
+    summary_only = request.args.get('view', 'full') == 'summary'
+    cursor = decode_cursor(request.args.get('cursor'))
+    if request.args.get('cursor') and cursor is None:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    if 'limit' not in request.args and cursor is None:
+        # Still read in bounded pages, just all of them
+        reports, next_cursor = get_reports_page(HISTORY_MAX_LIMIT, summary_only=summary_only)
+        while next_cursor:
+            page, next_cursor = get_reports_page(HISTORY_MAX_LIMIT, next_cursor, summary_only=summary_only)
+            reports.extend(page)
+    else:
+        try:
+            limit = int(request.args.get('limit', HISTORY_DEFAULT_LIMIT))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+        reports, next_cursor = get_reports_page(limit, cursor, summary_only=summary_only)
+    return jsonify({
+        "success": True,
+        "data": reports,
+        "nextCursor": encode_cursor(*next_cursor) if next_cursor else None,
+    })
 
 @app.route('/api/reports/<report_id>', methods=['GET'])
 def get_report(report_id):
@@ -119,14 +292,21 @@ def analyze():
     filename = file.filename
     safe_filename = str(uuid.uuid4()) + "_" + filename 
     
-    if not os.path.exists('uploads'):
-         os.makedirs('uploads')
+    if not os.path.exists(UPLOAD_DIR):
+         os.makedirs(UPLOAD_DIR)
          
-    filepath = os.path.join('uploads', safe_filename)
-    file.save(filepath)
+    filepath = os.path.join(UPLOAD_DIR, safe_filename)
+    # Chunked copy: hashed and size-checked in the same pass, never fully in memory
+    try:
+        digest, size = stream_to_disk(file.stream, filepath)
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    if size == 0:
+        os.remove(filepath)
+        return jsonify({"error": "Uploaded file is empty"}), 400
 
     try:
-        text = extract_text_from_image(filepath)
+        text, ocr_source = extract_report_text(filepath, digest)
         
         # We no longer force demo mode based on filenames to avoid confusion with real reports
         # Only analyze with AI
@@ -151,21 +331,9 @@ def analyze():
         tests = raw_analysis.get('tests', [])
         risk_summary, processed_tests = calculate_risk_level(tests)
         
-        # Priority 1: Use AI's explicit overall_risk if available
+        # Priority 1: Use AI's explicit overall_risk if available (banner from risk_rules.json)
         # Priority 2: Use calculated risk from severity.py
-        ai_risk = raw_analysis.get('overall_risk')
-        if ai_risk:
-            risk_summary['overallRisk'] = ai_risk
-            # Align banner colors with AI risk
-            if "High" in ai_risk:
-                risk_summary['severityBannerColor'] = "red"
-                risk_summary['bannerMessage'] = "CRITICAL FINDINGS DETECTED"
-            elif "Moderate" in ai_risk:
-                risk_summary['severityBannerColor'] = "yellow"
-                risk_summary['bannerMessage'] = "MODERATE DEVIATIONS DETECTED"
-            else:
-                risk_summary['severityBannerColor'] = "green"
-                risk_summary['bannerMessage'] = "OPTIMAL HEALTH PROFILE"
+        risk_summary = apply_ai_risk(risk_summary, raw_analysis.get('overall_risk'))
 
         report_id = str(uuid.uuid4())
         final_report = {
@@ -182,7 +350,8 @@ def analyze():
             "disclaimer": "This is not a medical diagnosis. Consult a doctor.",
             "createdAt": datetime.datetime.now().isoformat(),
             "imageUrl": f"/uploads/{safe_filename}",
-            "filename": filename
+            "filename": filename,
+            "ocrSource": ocr_source
         }
 
         save_report_data(final_report)
@@ -197,7 +366,7 @@ def analyze():
 
 @app.route('/uploads/<path:filename>')
 def serve_upload(filename):
-    return send_from_directory('uploads', filename)
+    return send_from_directory(UPLOAD_DIR, filename)
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -225,9 +394,6 @@ def demo_high():
 
 
 if __name__ == '__main__':
-    if not os.path.exists(REPORTS_FILE): 
-        with open(REPORTS_FILE, 'w') as f: json.dump([], f)
-    
     is_production = os.environ.get('RENDER', False) or os.environ.get('PRODUCTION', False)
     port = int(os.environ.get('PORT', 5000))
     
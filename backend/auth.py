@@ -56,7 +56,9 @@ def save_user():
             db.save_user(data)
             
         return jsonify({"status": "User saved/updated"}), 200
-            
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
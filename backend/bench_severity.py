@@ -0,0 +1,297 @@
+"""
+LAB-LENS Severity Benchmarks
+Times the severity engine (clean_value, get_status, calculate_risk_level,
+classify_batch) on a seeded synthetic corpus and reports throughput plus
+p50/p99 latency per function. Results can be saved as a baseline and later
+runs compared against it, failing when a function regresses past the
+tolerance.
+
+Usage (from backend/):
+    python bench_severity.py                          # compare with bench_baseline.json if present
+    python bench_severity.py --save-baseline bench_baseline.json
+    python bench_severity.py --reports 500 --seed 7 --tolerance 0.3
+"""
+import os
+import sys
+import gc
+import json
+import time
+import random
+import argparse
+import platform
+
+import severity
+from severity import MASTER_REFERENCE_DICTIONARY, TEST_NAME_ALIASES, UNIT_FAMILIES
+
+BASELINE_FILE = 'bench_baseline.json'
+DEFAULT_REPORTS = 200
+DEFAULT_SEED = 42
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_REPEAT = 3
+MIN_TESTS, MAX_TESTS = 5, 500
+
+# Names the LLM returns that are not in the reference data
+UNKNOWN_NAMES = [
+    "Vitamin D (25-OH)", "Vitamin B12", "Ferritin", "Serum Iron", "TIBC", "TSH", "Free T4",
+    "Total Cholesterol", "HDL Cholesterol", "LDL Cholesterol", "Triglycerides", "Sodium",
+    "Potassium", "Chloride", "Magnesium", "Urine Colour", "Pus Cells", "Epithelial Cells",
+]
+QUALITATIVE_VALUES = ["Negative", "Positive", "Non-Reactive", "Reactive", "Absent", "Nil", "Trace", "--"]
+
+# (name, value, sex, unit, expected status): unit conversions checked before timing
+CONVERSION_CHECKS = [
+    ("Platelet Count", "250", "M", "10^3/uL", "Normal"),
+    ("Platelet Count", "250000", "M", "/cumm", "Normal"),
+    ("Platelet Count", "2.5", "M", "lakhs/cumm", "Normal"),
+    ("Platelet Count", "2.5 lakhs", "M", None, "Normal"),
+    ("Platelet Count", "2.5 lakhs", "M", "/cumm", "Normal"),
+    ("Platelet Count", "2.5 lakhs", "M", "lakhs/cumm", "Normal"),
+    ("Platelet Count", "0.9 lakhs", "M", "lakhs/cumm", "Low"),
+    ("Fasting Glucose", "4.8", "M", "mmol/L", "Normal"),
+    ("Creatinine", "80", "M", "µmol/L", "Normal"),
+    ("Hemoglobin", "147", "M", "g/L", "Normal"),
+]
+
+
+# --- Synthetic corpus ---
+
+def _name_variants(key):
+    """Ways a report (or the LLM) spells a reference key."""
+    upper = key.upper() if len(key) <= 5 else key.title()
+    variants = [key, upper, key.title(), f"Serum {key.title()}", f"{upper} (F)", f"{key.title()} Level"]
+    aliases = [alias for alias, target in TEST_NAME_ALIASES.items() if target == key]
+    variants += [a.upper() if len(a) <= 5 else a.title() for a in aliases]
+    variants += [f"{a.title()} ({upper})" for a in aliases if len(a) > 5]
+    return variants
+
+
+def _pick_unit(rng, unit):
+    """Mostly the reference unit, sometimes missing or another unit of its family."""
+    roll = rng.random()
+    if roll < 0.10:
+        return rng.choice([None, ""])
+    if roll < 0.30:
+        normalized = severity.normalize_unit(unit)
+        for family in UNIT_FAMILIES:
+            if normalized in family:
+                return rng.choice(list(family))
+    return unit
+
+
+def _format_value(rng, low, high):
+    value = rng.uniform(low * 0.5, high * 1.6 if high else 1.0)
+    kind = rng.random()
+    if kind < 0.45:
+        return f"{value:.1f}"
+    if kind < 0.60:
+        return round(value, 2)
+    if kind < 0.68:
+        return f"{value * 1000:,.0f}"
+    if kind < 0.74:
+        return f"<{high}" if rng.random() < 0.5 else f">{low}"
+    if kind < 0.80:
+        return f"{low}-{high}"
+    if kind < 0.84:
+        return f"{value / 100000:.2f} lakhs"
+    if kind < 0.92:
+        return int(value)
+    return rng.choice(QUALITATIVE_VALUES)
+
+
+def generate_report(rng, size):
+    keys = list(MASTER_REFERENCE_DICTIONARY)
+    tests = []
+    for _ in range(size):
+        if rng.random() < 0.12:
+            tests.append({"name": rng.choice(UNKNOWN_NAMES), "value": rng.choice(QUALITATIVE_VALUES + ["12.4", "140"]),
+                          "unit": rng.choice(["", "mg/dL", "mmol/L"]), "status": rng.choice(["Normal", "High"])})
+            continue
+        key = rng.choice(keys)
+        ref = MASTER_REFERENCE_DICTIONARY[key]
+        low, high = ref.bounds(rng.choice("MF"))
+        tests.append({
+            "name": rng.choice(_name_variants(key)),
+            "value": _format_value(rng, low, high),
+            "unit": _pick_unit(rng, ref.unit),
+        })
+    return tests
+
+
+def generate_corpus(n_reports=DEFAULT_REPORTS, seed=DEFAULT_SEED):
+    """Deterministic list of synthetic reports (lists of test dicts), 5-500 tests each."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n_reports):
+        # Log-uniform sizes: mostly panel-sized reports with a long tail of big ones
+        size = int(round(MIN_TESTS * (MAX_TESTS / MIN_TESTS) ** rng.random()))
+        corpus.append(generate_report(rng, size))
+    return corpus
+
+
+# --- Checks ---
+
+def check_conversions():
+    """
+    Runs CONVERSION_CHECKS through get_status and classify_batch.
+    Returns: list of failure messages
+    """
+    names, values, sexes, units, expected = (list(col) for col in zip(*CONVERSION_CHECKS))
+    batch, _ = severity.classify_batch(names, values, sexes, units)
+    failures = []
+    for i, case in enumerate(CONVERSION_CHECKS):
+        single, _ = severity.get_status(*case[:4])
+        if single != expected[i] or batch[i] != expected[i]:
+            failures.append(f"{case[:4]}: expected {expected[i]}, got {single} (get_status) / {batch[i]} (classify_batch)")
+    return failures
+
+
+# --- Timing ---
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _measure(calls):
+    """Run zero-arg callables one by one with GC paused (as timeit does). Returns per-call nanoseconds."""
+    timer = time.perf_counter_ns
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for call in calls:
+            start = timer()
+            call()
+            samples.append(timer() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return samples
+
+
+def _summarize(samples, unit_count):
+    samples.sort()
+    total_s = sum(samples) / 1e9
+    return {
+        "calls": len(samples),
+        "throughput": unit_count / total_s if total_s else 0.0,
+        "p50_us": _percentile(samples, 0.50) / 1000.0,
+        "p99_us": _percentile(samples, 0.99) / 1000.0,
+    }
+
+
+def run_benchmarks(corpus):
+    """Returns: {function: {calls, throughput, p50_us, p99_us}}"""
+    tests = [t for report in corpus for t in report]
+    results = {}
+
+    # Warm the name resolver the way a long-running worker would be
+    for t in tests:
+        severity.canonical_test_name(t["name"])
+
+    values = [t["value"] for t in tests]
+    results["clean_value"] = _summarize(
+        _measure([lambda v=v: severity.clean_value(v) for v in values]), len(values))
+
+    results["get_status"] = _summarize(
+        _measure([lambda t=t: severity.get_status(t["name"], t["value"], "M", t.get("unit")) for t in tests]), len(tests))
+
+    # Per report; calculate_risk_level mutates statuses, so each call gets fresh copies
+    reports = [[dict(t) for t in report] for report in corpus]
+    results["calculate_risk_level"] = _summarize(
+        _measure([lambda r=r: severity.calculate_risk_level(r) for r in reports]), len(tests))
+
+    columns = [([t["name"] for t in r], [t["value"] for t in r], [t.get("unit") for t in r]) for r in corpus]
+    results["classify_batch"] = _summarize(
+        _measure([lambda c=c: severity.classify_batch(c[0], c[1], "M", c[2]) for c in columns]), len(tests))
+
+    results["clean_values"] = _summarize(
+        _measure([lambda c=c: severity.clean_values(c[1]) for c in columns]), len(tests))
+    return results
+
+
+def best_of(runs):
+    """Per function, the fastest of several runs (least disturbed by other load)."""
+    return {name: min((run[name] for run in runs), key=lambda r: r["p50_us"]) for name in runs[0]}
+
+
+# --- Baseline comparison ---
+
+def compare(results, baseline, tolerance):
+    """Prints deltas vs the baseline. Returns the names of regressed functions."""
+    regressions = []
+    print(f"\nVs baseline ({baseline['meta'].get('created', 'unknown date')}, tolerance {tolerance:.0%}):")
+    for name, current in results.items():
+        base = baseline["results"].get(name)
+        if not base:
+            print(f"  {name:<22} (no baseline)")
+            continue
+        slower = current["p50_us"] / base["p50_us"] - 1 if base["p50_us"] else 0.0
+        throughput = current["throughput"] / base["throughput"] - 1 if base["throughput"] else 0.0
+        regressed = slower > tolerance or throughput < -tolerance
+        mark = "⚠️ REGRESSION" if regressed else "✓"
+        print(f"  {name:<22} p50 {slower:+7.1%}   throughput {throughput:+7.1%}   {mark}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def print_results(results, corpus):
+    n_tests = sum(len(r) for r in corpus)
+    print(f"Corpus: {len(corpus)} reports, {n_tests} tests | numpy: {'yes' if severity.np is not None else 'no'}")
+    print(f"{'function':<22} {'calls':>8} {'items/s':>12} {'p50 (µs)':>10} {'p99 (µs)':>10}")
+    for name, r in results.items():
+        print(f"{name:<22} {r['calls']:>8} {r['throughput']:>12,.0f} {r['p50_us']:>10.2f} {r['p99_us']:>10.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the severity engine on a synthetic corpus.")
+    parser.add_argument('--reports', type=int, default=DEFAULT_REPORTS, help="synthetic reports to generate")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="corpus seed")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="runs per function; the fastest is reported")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline to compare against (default: %(default)s)")
+    parser.add_argument('--save-baseline', metavar='FILE', help="write this run's results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown before failing (fraction)")
+    args = parser.parse_args(argv)
+
+    failures = check_conversions()
+    if failures:
+        print("⚠️ Unit conversion checks failed:\n  " + "\n  ".join(failures))
+        return 1
+
+    corpus = generate_corpus(args.reports, args.seed)
+    results = best_of([run_benchmarks(corpus) for _ in range(max(1, args.repeat))])
+    print_results(results, corpus)
+
+    if args.save_baseline:
+        baseline = {
+            "meta": {
+                "created": time.strftime("%Y-%m-%d"),
+                "reports": args.reports,
+                "seed": args.seed,
+                "repeat": args.repeat,
+                "python": platform.python_version(),
+                "numpy": severity.np is not None,
+                "referenceVersion": severity.REFERENCE_VERSION,
+            },
+            "results": results,
+        }
+        with open(args.save_baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"\n✓ Baseline saved to {args.save_baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    if (baseline["meta"].get("reports"), baseline["meta"].get("seed")) != (args.reports, args.seed):
+        print("\n⚠️ Baseline was recorded with a different corpus size/seed; deltas are not comparable.")
+    return 1 if compare(results, baseline, args.tolerance) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
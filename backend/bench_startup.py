@@ -0,0 +1,166 @@
+"""
+LAB-LENS Startup Benchmark
+Measures what a gunicorn worker pays to import app.py: total wall-clock time
+of a fresh `import app` and the cumulative import time of the heaviest
+modules (python -X importtime). Each run happens in a subprocess inside a
+scratch directory, with a dummy Gemini key and an unreachable MONGO_URI, so
+it also checks that neither the model SDK nor a MongoDB outage is paid for
+at import time. Results can be saved as a baseline and later runs compared
+against it, like bench_severity.py.
+
+Usage (from backend/):
+    python bench_startup.py                           # compare with bench_startup_baseline.json if present
+    python bench_startup.py --save-baseline bench_startup_baseline.json
+    python bench_startup.py --runs 10 --tolerance 0.5
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+BASELINE_FILE = 'bench_startup_baseline.json'
+DEFAULT_RUNS = 5
+DEFAULT_TOLERANCE = 0.3
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules whose cumulative import time is reported
+TRACKED_MODULES = (
+    'app', 'ocr', 'gemini', 'severity', 'mongo_client', 'report_log', 'image_prep',
+    'flask', 'pymongo', 'PIL.Image', 'pypdf', 'numpy', 'google.generativeai',
+)
+# Must not be imported by `import app`: created on first use
+LAZY_MODULES = ('google.generativeai',)
+# Only the total fails the run; per-module rows are for finding the culprit
+GATED = ('import_app',)
+
+BENCH_ENV = {
+    "GEMINI_API_KEY": "bench-dummy-key",
+    # Nothing listens on port 9: a connect here must not delay the import
+    "MONGO_URI": "mongodb://127.0.0.1:9/?serverSelectionTimeoutMS=5000",
+    "PYTHONDONTWRITEBYTECODE": "1",
+}
+
+
+def parse_importtime(stderr):
+    """{module: cumulative microseconds} from python -X importtime output."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if len(parts) == 3 and parts[1].isdigit():
+            times[parts[2]] = int(parts[1])
+    return times
+
+
+def time_import(workdir):
+    """One fresh interpreter importing app. Returns (wall ms, {module: cumulative ms})."""
+    env = dict(os.environ, **BENCH_ENV)
+    env["PYTHONPATH"] = BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    code = ("import time; t = time.perf_counter(); import app; "
+            "print('WALL', (time.perf_counter() - t) * 1000)")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=workdir, env=env,
+                          capture_output=True, text=True, timeout=120)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import app failed:\n{proc.stderr[-2000:]}")
+    wall = next(float(line.split()[1]) for line in proc.stdout.splitlines() if line.startswith("WALL "))
+    modules = {name: us / 1000.0 for name, us in parse_importtime(proc.stderr).items()}
+    return wall, modules
+
+
+def run_benchmark(runs):
+    """Returns: ({"import_app": {...}, module: {...}}, [modules imported eagerly that should be lazy])"""
+    walls, per_module = [], {name: [] for name in TRACKED_MODULES}
+    eager = set()
+    for _ in range(runs):
+        # Fresh scratch dir per run: app creates its local logs in the working directory
+        workdir = tempfile.mkdtemp(prefix="lablens-startup-")
+        try:
+            wall, modules = time_import(workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        walls.append(wall)
+        for name in TRACKED_MODULES:
+            if name in modules:
+                per_module[name].append(modules[name])
+        eager.update(name for name in LAZY_MODULES if name in modules)
+
+    results = {"import_app": {"median_ms": statistics.median(walls), "min_ms": min(walls)}}
+    for name, samples in per_module.items():
+        if samples:
+            results[name] = {"median_ms": statistics.median(samples), "min_ms": min(samples)}
+    return results, sorted(eager)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints deltas of the fastest run (least disturbed by other load) vs the
+    baseline. Returns the gated names that regressed.
+    """
+    regressions = []
+    print(f"\nVs baseline ({baseline['meta'].get('created', 'unknown date')}, tolerance {tolerance:.0%}):")
+    for name, current in results.items():
+        base = baseline["results"].get(name)
+        if not base:
+            print(f"  {name:<22} (no baseline)")
+            continue
+        slower = current["min_ms"] / base["min_ms"] - 1 if base["min_ms"] else 0.0
+        regressed = slower > tolerance and name in GATED
+        mark = "⚠️ REGRESSION" if regressed else ("✓" if name in GATED else "")
+        print(f"  {name:<22} min {slower:+7.1%}   {mark}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def print_results(results, runs):
+    print(f"{runs} fresh interpreter(s) | Python {platform.python_version()}")
+    print(f"{'import':<22} {'median (ms)':>12} {'min (ms)':>10}")
+    for name, r in results.items():
+        print(f"{name:<22} {r['median_ms']:>12.1f} {r['min_ms']:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark worker import time of app.py.")
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help="fresh interpreters to time")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline to compare against (default: %(default)s)")
+    parser.add_argument('--save-baseline', metavar='FILE', help="write this run's results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown before failing (fraction)")
+    args = parser.parse_args(argv)
+
+    results, eager = run_benchmark(max(1, args.runs))
+    print_results(results, args.runs)
+    if eager:
+        print(f"\n⚠️ Imported at startup but meant to load lazily: {', '.join(eager)}")
+        return 1
+
+    if args.save_baseline:
+        baseline = {
+            "meta": {
+                "created": time.strftime("%Y-%m-%d"),
+                "runs": args.runs,
+                "python": platform.python_version(),
+            },
+            "results": results,
+        }
+        with open(args.save_baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"\n✓ Baseline saved to {args.save_baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    return 1 if compare(results, baseline, args.tolerance) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
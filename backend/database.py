@@ -1,63 +1,86 @@
 import os
-import json
-from pymongo import MongoClient
+import sqlite3
 from dotenv import load_dotenv
+from mongo_client import MONGO_URI, get_db
+from report_log import ReportLog
+from sqlite_store import SQLiteStore
 
 load_dotenv()
 
-MONGO_URI = os.getenv('MONGO_URI')
-DB_NAME = os.getenv('MONGO_DB_NAME', 'cortex_lmh')
+# '' picks MongoDB when MONGO_URI is set and local JSON otherwise; 'sqlite' or 'json' forces an embedded engine
+# Only Database (used by auth.py) honours this; app.py's report routes keep their own MongoDB/report-log storage
+STORAGE_ENGINE = os.getenv('STORAGE_ENGINE', '').lower()
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'lablens.db')
 
 class Database:
     def __init__(self):
         self.use_mongo = False
-        if MONGO_URI:
-            try:
-                self.client = MongoClient(MONGO_URI)
-
-                self.client.admin.command('ping')
-                self.db = self.client[DB_NAME]
+        self.use_sqlite = False
+        self.REPORTS_FILE = 'reports.json'
+        self.REPORTS_LOG_FILE = 'reports.jsonl'
+        self.REPORTS_LOG_DIR = 'reports_log'
+        self.USERS_FILE = 'users.json'
+        self.USERS_LOG_DIR = 'users_log'
+
+        if MONGO_URI and STORAGE_ENGINE in ('', 'mongo'):
+            self.db = get_db()
+            if self.db is not None:
                 self.reports = self.db.reports
                 self.users = self.db.users
                 self.use_mongo = True
                 print("Using MongoDB Atlas for storage.")
-            except Exception as e:
-                print(f"Error connecting to MongoDB: {e}. Falling back to local JSON files.")
-        
-        if not self.use_mongo:
-            print("Using local JSON files for storage.")
-            self.REPORTS_FILE = 'reports.json'
-            self.USERS_FILE = 'users.json'
-            self._init_local_files()
+            else:
+                print("MongoDB unavailable. Falling back to local storage.")
 
-    def _init_local_files(self):
-        for file in [self.REPORTS_FILE, self.USERS_FILE]:
-            if not os.path.exists(file):
-                with open(file, 'w') as f:
-                    json.dump([], f)
+        if not self.use_mongo and STORAGE_ENGINE == 'sqlite':
+            try:
+                self.sqlite = SQLiteStore(SQLITE_PATH)
+                self.use_sqlite = True
+                print(f"Using SQLite for storage: {SQLITE_PATH}")
+                if self.sqlite.count_reports() == 0 and self.sqlite.count_users() == 0:
+                    self._import_local_files()
+            except sqlite3.Error as e:
+                print(f"Error opening SQLite database: {e}. Falling back to local JSON files.")
+
+        if not self.use_mongo and not self.use_sqlite:
+            print("Using local JSON files for storage.")
+            self.report_log = ReportLog(self.REPORTS_LOG_DIR, legacy_paths=(self.REPORTS_LOG_FILE, self.REPORTS_FILE))
+            self.user_log = self._open_user_log()
+
+    def _open_user_log(self):
+        """Append-only user log keyed (and hash-indexed in memory) by email."""
+        return ReportLog(self.USERS_LOG_DIR, legacy_paths=(self.USERS_FILE,), key='email')
+
+    def _import_local_files(self):
+        """One-time copy of existing local JSON data into a fresh SQLite database."""
+        reports = ReportLog(self.REPORTS_LOG_DIR, legacy_paths=(self.REPORTS_LOG_FILE, self.REPORTS_FILE)).all()
+        users = self._open_user_log().all()
+        if reports:
+            self.sqlite.save_reports(reports)
+        for user in users:
+            if user.get('email'):
+                self.sqlite.save_user(user)
+        if reports or users:
+            print(f"✓ Imported {len(reports)} reports and {len(users)} users into SQLite")
 
 
     def get_all_reports(self):
         if self.use_mongo:
             return list(self.reports.find({}, {'_id': 0}))
+        elif self.use_sqlite:
+            return self.sqlite.get_all_reports()
         else:
-            try:
-                with open(self.REPORTS_FILE, 'r') as f:
-                    return json.load(f)
-            except:
-                return []
+            return self.report_log.all()
 
     def save_report(self, report_data):
         if self.use_mongo:
             self.reports.insert_one(report_data.copy())
             return True
+        elif self.use_sqlite:
+            return self.sqlite.save_report(report_data)
         else:
             try:
-                reports = self.get_all_reports()
-                reports.append(report_data)
-                with open(self.REPORTS_FILE, 'w') as f:
-                    json.dump(reports, f, indent=4)
-                return True
+                return self.report_log.append(report_data)
             except Exception as e:
                 print(f"Error saving report: {e}")
                 return False
@@ -65,22 +88,41 @@ class Database:
     def get_report_by_id(self, report_id):
         if self.use_mongo:
             return self.reports.find_one({"id": report_id}, {'_id': 0})
+        elif self.use_sqlite:
+            return self.sqlite.get_report(report_id)
         else:
-            reports = self.get_all_reports()
-            return next((r for r in reports if r.get('id') == report_id), None)
+            return self.report_log.get(report_id)
+
+    def delete_report(self, report_id):
+        if self.use_mongo:
+            return self.reports.delete_one({"id": report_id}).deleted_count > 0
+        elif self.use_sqlite:
+            return self.sqlite.delete_report(report_id)
+        else:
+            return self.report_log.delete(report_id)
+
+    def get_reports_by_patient(self, name):
+        if self.use_mongo:
+            return list(self.reports.find({"patient.name": name}, {'_id': 0}).sort('createdAt', -1))
+        elif self.use_sqlite:
+            return self.sqlite.get_reports_by_patient(name)
+        else:
+            reports = self.get_all_reports()[::-1]
+            return [r for r in reports if (r.get('patient') or {}).get('name') == name]
 
 
     def get_all_users(self):
         if self.use_mongo:
             return list(self.users.find({}, {'_id': 0}))
+        elif self.use_sqlite:
+            return self.sqlite.get_all_users()
         else:
-            try:
-                with open(self.USERS_FILE, 'r') as f:
-                    return json.load(f)
-            except:
-                return []
+            return self.user_log.all()
 
     def save_user(self, user_data):
+        # Every engine keys users by email; without one the user could not be stored or found again
+        if not user_data.get('email'):
+            raise ValueError("user has no email")
         if self.use_mongo:
 
             self.users.update_one(
@@ -89,19 +131,12 @@ class Database:
                 upsert=True
             )
             return True
+        elif self.use_sqlite:
+            return self.sqlite.save_user(user_data)
         else:
             try:
-                users = self.get_all_users()
-
-                existing_index = next((i for i, u in enumerate(users) if u.get('email') == user_data.get('email')), None)
-                if existing_index is not None:
-                    users[existing_index] = user_data
-                else:
-                    users.append(user_data)
-                
-                with open(self.USERS_FILE, 'w') as f:
-                    json.dump(users, f, indent=4)
-                return True
+                # Upsert: the newest record for an email supersedes older ones
+                return self.user_log.append(user_data)
             except Exception as e:
                 print(f"Error saving user: {e}")
                 return False
@@ -109,8 +144,11 @@ class Database:
     def get_user_by_email(self, email):
         if self.use_mongo:
             return self.users.find_one({"email": email}, {'_id': 0})
+        elif self.use_sqlite:
+            return self.sqlite.get_user_by_email(email)
         else:
-            users = self.get_all_users()
-            return next((u for u in users if u.get('email') == email), None)
+            if not email:
+                return None
+            return self.user_log.get(email)
 
 db = Database()
@@ -3,46 +3,24 @@ LAB-LENS AI Analysis Module
 Uses Google Gemini for medical report analysis and chat
 With robust fallback to demo data when API unavailable
 """
-import os
 import json
-import google.generativeai as genai
 from dotenv import load_dotenv
 from demo_data import get_demo_report, get_demo_chat_response
 
 load_dotenv()
 
-API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("API_KEY")
-API_WORKING = False
+from genai_client import api_configured, get_model
 
-if not API_KEY:
+if not api_configured():
     print("WARNING: No API key found. Using demo mode.")
-else:
-    try:
-        genai.configure(api_key=API_KEY)
-        print("Gemini AI configured successfully")
-        API_WORKING = True
-    except Exception as e:
-        print(f"Gemini config failed: {e}. Using demo mode.")
-
-
-text_model = None
-if API_WORKING:
-    try:
-        # Using a lower temperature for medical analysis to ensure consistency and reduce hallucinations
-        generation_config = {
-            "temperature": 0.1,
-            "top_p": 0.95,
-            "top_k": 40,
-            "max_output_tokens": 2048,
-        }
-        text_model = genai.GenerativeModel(
-            model_name='gemini-1.5-flash',
-            generation_config=generation_config
-        )
-        print(f"Text model initialized: gemini-1.5-flash (Low Temp)")
-    except Exception as e:
-        print(f"Model init failed: {e}. Using demo mode.")
-        API_WORKING = False
+
+# Using a lower temperature for medical analysis to ensure consistency and reduce hallucinations
+GENERATION_CONFIG = {
+    "temperature": 0.1,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 2048,
+}
 
 
 def analyze_lab_report(text_content, filename=None):
@@ -53,7 +31,8 @@ def analyze_lab_report(text_content, filename=None):
     """
     print(f"analyze_lab_report called with {len(text_content)} characters")
 
-    if API_WORKING and text_model:
+    text_model = get_model()
+    if text_model:
         try:
             prompt = f"""
 You are an expert Medical Laboratory Scientist using the Lab-Lens Precision Engine. 
@@ -110,7 +89,7 @@ REPORT TEXT:
 JSON Response:
 """
             
-            response = text_model.generate_content(prompt)
+            response = text_model.generate_content(prompt, generation_config=GENERATION_CONFIG)
             response_text = response.text
             
             # Extract JSON from response if it's wrapped in markers
@@ -165,7 +144,8 @@ def chat_with_context(message, report_context):
     print(f"chat_with_context called with message: {message[:50]}...")
     
 
-    if API_WORKING and text_model:
+    text_model = get_model()
+    if text_model:
         try:
             context = ""
             if report_context and isinstance(report_context, dict):
@@ -201,7 +181,7 @@ Rules:
 JSON Response:
 """
             
-            response = text_model.generate_content(full_prompt)
+            response = text_model.generate_content(full_prompt, generation_config=GENERATION_CONFIG)
             text = response.text
             
             if '{' in text and '}' in text:
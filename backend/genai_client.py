@@ -0,0 +1,48 @@
+"""
+LAB-LENS Gemini Client
+One lazily created Gemini model shared by ocr.py and gemini.py. Importing
+google.generativeai costs most of a worker's boot time, so nothing is
+imported or configured until the first call that needs the model; callers
+pass their own generation_config per request.
+"""
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+_model = None
+_failed = False
+_lock = threading.Lock()
+
+
+def api_configured():
+    """True when an API key is set. Doesn't import the SDK."""
+    return bool(API_KEY) and not _failed
+
+
+def get_model():
+    """
+    The shared GenerativeModel, created on first use.
+    Returns None without an API key or if the SDK could not be set up.
+    """
+    global _model, _failed
+    if _model is not None or _failed or not API_KEY:
+        return _model
+
+    with _lock:
+        if _model is not None or _failed:
+            return _model
+        try:
+            import google.generativeai as genai
+            genai.configure(api_key=API_KEY)
+            _model = genai.GenerativeModel(model_name=GEMINI_MODEL)
+        except Exception as e:
+            print(f"Gemini init failed: {e}. Using demo mode.")
+            _failed = True
+            return None
+        print(f"Gemini model initialized: {GEMINI_MODEL}")
+        return _model
@@ -0,0 +1,162 @@
+"""
+LAB-LENS Image Pre-processing
+Shrinks report images before they are sent to the vision model: EXIF-aware
+rotation, grayscale, downscaling to OCR_IMAGE_MAX_DIM and re-encoding to a
+compact format. Scanned PDFs get the same treatment for their embedded page
+images. Phone photos are 8-12 MP; text stays legible well below that, so the
+extra pixels only cost upload bytes and model latency.
+
+Usage (from backend/), to tune the settings against sample files:
+    python image_prep.py ../report_low_risk.png ../reports-1.pdf
+"""
+import os
+import io
+import sys
+import time
+import threading
+from PIL import Image, ImageOps
+
+try:
+    from pypdf import PdfWriter
+except ImportError:  # scanned PDFs are then sent unchanged
+    PdfWriter = None
+
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "true").lower() in ("1", "true", "yes")
+OCR_IMAGE_MAX_DIM = int(os.getenv("OCR_IMAGE_MAX_DIM", 2000))
+# AUTO keeps whichever of PNG and JPEG is smaller: PNG wins on clean scans and
+# screenshots (few gray levels), JPEG on noisy phone photos
+OCR_IMAGE_FORMAT = os.getenv("OCR_IMAGE_FORMAT", "AUTO").upper()
+OCR_IMAGE_QUALITY = int(os.getenv("OCR_IMAGE_QUALITY", 80))
+
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+class PreprocessStats:
+    """Per-worker bytes-before/after counters for images and PDFs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.seconds = 0.0
+
+    def record(self, before, after, seconds):
+        with self._lock:
+            self.files += 1
+            self.bytes_before += before
+            self.bytes_after += after
+            self.seconds += seconds
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": self.files,
+                "bytesBefore": self.bytes_before,
+                "bytesAfter": self.bytes_after,
+                "savedRatio": round(1 - self.bytes_after / self.bytes_before, 4) if self.bytes_before else 0.0,
+                "seconds": round(self.seconds, 3),
+            }
+
+
+preprocess_stats = PreprocessStats()
+
+
+def prepare_image(image, max_dim=OCR_IMAGE_MAX_DIM):
+    """Upright, grayscale, no side longer than max_dim."""
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("L")
+    if max(image.size) > max_dim:
+        image.thumbnail((max_dim, max_dim), Image.LANCZOS)
+    return image
+
+
+def encode_image(image, fmt=OCR_IMAGE_FORMAT, quality=OCR_IMAGE_QUALITY):
+    """Returns: (bytes, format)"""
+    if fmt == "AUTO":
+        return min((encode_image(image, f, quality) for f in ("PNG", "JPEG")), key=lambda r: len(r[0]))
+    buf = io.BytesIO()
+    if fmt == "PNG":
+        image.save(buf, format=fmt, optimize=True)
+    else:
+        image.save(buf, format=fmt, quality=quality)
+    return buf.getvalue(), fmt
+
+
+def pdf_stream(data):
+    """A seekable stream over PDF bytes; file-like objects (e.g. an mmap) are used as they are."""
+    return data if hasattr(data, "seek") else io.BytesIO(data)
+
+
+def _read(file_path):
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+def preprocess_image_file(file_path):
+    """
+    Returns: (image bytes, mime type) ready for the vision model.
+    The original file is used whenever re-encoding would not make it smaller.
+    """
+    started = time.perf_counter()
+    original_size = os.path.getsize(file_path)
+    # PIL decodes straight from the file; the original bytes are only read if they are sent
+    with Image.open(file_path) as image:
+        original_mime = Image.MIME.get(image.format, "image/png")
+        if not OCR_PREPROCESS:
+            return _read(file_path), original_mime
+        data, fmt = encode_image(prepare_image(image))
+
+    if len(data) >= original_size:
+        data, mime = _read(file_path), original_mime
+    else:
+        mime = MIME_TYPES[fmt]
+    preprocess_stats.record(original_size, len(data), time.perf_counter() - started)
+    print(f"Pre-processed image: {original_size} -> {len(data)} bytes")
+    return data, mime
+
+
+def shrink_pdf(file_data):
+    """Re-encode the page images embedded in a (scanned) PDF. Returns the smaller of old and new bytes."""
+    if not OCR_PREPROCESS or PdfWriter is None:
+        return file_data
+    started = time.perf_counter()
+    try:
+        writer = PdfWriter(clone_from=pdf_stream(file_data))
+        replaced = 0
+        for page in writer.pages:
+            for embedded in page.images:
+                embedded.replace(prepare_image(embedded.image), quality=OCR_IMAGE_QUALITY)
+                replaced += 1
+        if not replaced:
+            return file_data  # text/vector PDF; nothing to shrink
+        buf = io.BytesIO()
+        writer.write(buf)
+        data = buf.getvalue()
+    except Exception as e:
+        print(f"⚠️ Could not shrink PDF images ({e}); sending it unchanged")
+        return file_data
+
+    if len(data) >= len(file_data):
+        data = file_data
+    preprocess_stats.record(len(file_data), len(data), time.perf_counter() - started)
+    print(f"Pre-processed PDF images: {len(file_data)} -> {len(data)} bytes")
+    return data
+
+
+def main(paths):
+    for path in paths:
+        if path.lower().endswith(".pdf"):
+            with open(path, "rb") as f:
+                shrink_pdf(f.read())
+        else:
+            preprocess_image_file(path)
+    s = preprocess_stats.stats()
+    print(f"\n{s['files']} file(s): {s['bytesBefore']} -> {s['bytesAfter']} bytes "
+          f"({s['savedRatio']:.1%} saved) in {s['seconds']}s "
+          f"[max dim {OCR_IMAGE_MAX_DIM}, {OCR_IMAGE_FORMAT} q{OCR_IMAGE_QUALITY}]")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,97 @@
+"""
+LAB-LENS MongoDB Client
+One pooled MongoClient per process, shared by app.py and database.py,
+plus idempotent index bootstrapping for the reports, report_summaries
+and users collections. connect_in_background() lets a worker finish booting
+while the first connection (up to MONGO_TIMEOUT_MS) is still in flight.
+"""
+import os
+import threading
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "cortex_lmh")
+
+# Pool tuning (per gunicorn worker)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 20))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 2))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", 60000))
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", 5000))
+
+_client = None
+_db = None
+_failed = False
+_lock = threading.Lock()
+_connect_thread = None
+
+
+def ensure_indexes(db):
+    """Create the indexes our queries rely on. Safe to call on every start."""
+    specs = [
+        (db.reports, [("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        (db.reports, [("createdAt", DESCENDING), ("id", DESCENDING)], {"name": "createdAt_id"}),
+        (db.report_summaries, [("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+        (db.report_summaries, [("createdAt", DESCENDING), ("id", DESCENDING)], {"name": "createdAt_id"}),
+        (db.users, [("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+    ]
+    for collection, keys, options in specs:
+        try:
+            collection.create_index(keys, **options)
+        except PyMongoError as e:
+            # e.g. existing duplicates block a unique index; queries still work without it
+            print(f"⚠️ Could not create index {options['name']} on {collection.name}: {e}")
+
+
+def get_db():
+    """
+    Returns the shared database handle, connecting on first use.
+    Returns None when MONGO_URI is unset or the cluster was unreachable.
+    """
+    global _client, _db, _failed
+    if _db is not None or _failed or not MONGO_URI:
+        return _db
+
+    with _lock:
+        if _db is not None or _failed:
+            return _db
+        try:
+            client = MongoClient(
+                MONGO_URI,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+                serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+                connectTimeoutMS=MONGO_TIMEOUT_MS,
+                retryWrites=True,
+            )
+            # Force a connection check
+            client.admin.command('ping')
+            db = client[MONGO_DB_NAME]
+            ensure_indexes(db)
+        except Exception as e:
+            print(f"⚠️ MongoDB Connection failed: {e}")
+            _failed = True
+            return None
+
+        _client, _db = client, db
+        print(f"✅ Connected to MongoDB Atlas: {MONGO_DB_NAME}")
+        return _db
+
+
+def connect_in_background():
+    """
+    Start get_db() on a daemon thread and return immediately. A later
+    get_db() call waits for that attempt (it holds the lock) instead of
+    starting its own.
+    """
+    global _connect_thread
+    if not MONGO_URI or _db is not None or _failed:
+        return
+    with _lock:
+        if _connect_thread is None:
+            _connect_thread = threading.Thread(target=get_db, name="mongo-connect", daemon=True)
+            _connect_thread.start()
@@ -4,45 +4,140 @@ Uses Google Gemini Vision for medical report text extraction
 With robust fallback for demo mode
 """
 import os
-from PIL import Image
-import google.generativeai as genai
+import io
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # PDFs are then sent to the model as one blob
+    PdfReader = PdfWriter = None
+
 load_dotenv()
 
-API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("API_KEY")
-API_WORKING = False
+from ocr_cache import OCR_CACHE, OCRCache, file_digest
+from image_prep import preprocess_image_file, shrink_pdf, preprocess_stats, pdf_stream
+from uploads import map_file
+from genai_client import api_configured, get_model
 
-if not API_KEY:
+if not api_configured():
     print("WARNING: No API key found for OCR. Using demo mode.")
-else:
+
+# Low temperature for precise OCR extraction
+GENERATION_CONFIG = {
+    "temperature": 0.1,
+    "top_p": 0.95,
+    "top_k": 40,
+}
+
+# Only real vision results are cached; demo text is free to regenerate
+ocr_cache = OCRCache() if OCR_CACHE and api_configured() else None
+
+OCR_PROMPT = (
+    "Extract ALL text from this medical laboratory report. "
+    "Include test names, values, units, reference ranges, patient info, and dates. "
+    "Transcribe exactly as shown, preserving the structure."
+)
+
+# Multi-page PDFs are split and OCR'd page by page on a bounded pool, so a long
+# report takes about as long as its slowest page instead of one serial call
+OCR_PAGE_WORKERS = int(os.getenv("OCR_PAGE_WORKERS", 4))
+OCR_PAGE_RETRIES = int(os.getenv("OCR_PAGE_RETRIES", 2))
+OCR_RETRY_BACKOFF_S = 1.0
+
+_page_pool = None
+_page_pool_lock = threading.Lock()
+
+# PDF text-layer fast path: used instead of vision when the layer has at least
+# this many characters and label-plus-number rows
+OCR_TEXT_LAYER_MIN_CHARS = int(os.getenv("OCR_TEXT_LAYER_MIN_CHARS", 200))
+OCR_TEXT_LAYER_MIN_ROWS = int(os.getenv("OCR_TEXT_LAYER_MIN_ROWS", 5))
+_DATA_ROW = re.compile(r"[A-Za-z]{2,}.*?\d")
+
+OCR_SOURCES = ("text-layer", "cache", "vision", "demo", "error")
+_source_counts = dict.fromkeys(OCR_SOURCES, 0)
+_source_lock = threading.Lock()
+
+
+def _get_page_pool():
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool = ThreadPoolExecutor(max_workers=OCR_PAGE_WORKERS, thread_name_prefix="ocr-page")
+        return _page_pool
+
+
+def split_pdf_pages(file_data):
+    """One single-page PDF (bytes) per page, or None if the PDF can't be split here."""
+    if PdfReader is None:
+        return None
     try:
-        genai.configure(api_key=API_KEY)
-        print("Gemini OCR configured successfully")
-        API_WORKING = True
+        reader = PdfReader(pdf_stream(file_data))
+        pages = []
+        for page in reader.pages:
+            writer = PdfWriter()
+            writer.add_page(page)
+            buf = io.BytesIO()
+            writer.write(buf)
+            pages.append(buf.getvalue())
+        return pages
     except Exception as e:
-        print(f"OCR config failed: {e}. Using demo mode.")
+        print(f"⚠️ Could not split PDF into pages ({e}); sending it whole")
+        return None
 
 
-vision_model = None
-if API_WORKING:
-    try:
-        # Low temperature for precise OCR extraction
-        generation_config = {
-            "temperature": 0.1,
-            "top_p": 0.95,
-            "top_k": 40,
-        }
-        vision_model = genai.GenerativeModel(
-            model_name='gemini-1.5-flash',
-            generation_config=generation_config
-        )
-        print(f"Vision model initialized: gemini-1.5-flash (Low Temp)")
-    except Exception as e:
-        print(f"Vision model init failed: {e}. Using demo mode.")
-        API_WORKING = False
+def _ocr_pdf_blob(data):
+    # Gemini 1.5 Flash can handle PDF blobs directly; the SDK needs real bytes, not a mapping
+    if not isinstance(data, bytes):
+        data = bytes(data)
+    response = get_model().generate_content([{"mime_type": "application/pdf", "data": data}, OCR_PROMPT],
+                                            generation_config=GENERATION_CONFIG)
+    return response.text
 
 
+def _ocr_pdf_page(page_data, page_number):
+    """OCR one page, retrying it on its own with backoff."""
+    for attempt in range(OCR_PAGE_RETRIES + 1):
+        try:
+            return _ocr_pdf_blob(page_data)
+        except Exception as e:
+            if attempt == OCR_PAGE_RETRIES:
+                raise
+            print(f"⚠️ OCR of page {page_number} failed ({e}); retrying")
+            time.sleep(OCR_RETRY_BACKOFF_S * (2 ** attempt))
+
+
+def ocr_pdf(file_data):
+    """
+    OCR a PDF (bytes or a read-only mmap), page-parallel when it has several
+    pages.
+    Returns: (text in page order, partial) where partial is True if any page
+    could not be read and stands in the text as a placeholder.
+    """
+    file_data = shrink_pdf(file_data)
+    pages = split_pdf_pages(file_data)
+    if not pages or len(pages) == 1:
+        return _ocr_pdf_blob(file_data), False
+
+    print(f"OCR'ing {len(pages)} pages on up to {OCR_PAGE_WORKERS} threads")
+    pool = _get_page_pool()
+    futures = [pool.submit(_ocr_pdf_page, page, n) for n, page in enumerate(pages, 1)]
+    texts, failed = [], 0
+    for n, future in enumerate(futures, 1):
+        try:
+            texts.append((future.result() or "").strip())
+        except Exception as e:
+            # Keep the pages that were read; the analysis can still use them
+            print(f"⚠️ OCR of page {n} failed after {OCR_PAGE_RETRIES} retries: {e}")
+            texts.append(f"[Page {n} could not be read]")
+            failed += 1
+    if failed == len(pages):
+        raise RuntimeError(f"all {len(pages)} pages failed OCR")
+    return "\n\n".join(texts), failed > 0
+
 
 DEMO_OCR_TEXT = """
 MEDICAL LABORATORY REPORT
@@ -91,63 +186,123 @@ Note: This is a laboratory report for educational demonstration purposes.
 """
 
 
-def extract_text_from_image(file_path):
+def ocr_cache_stats():
+    """Hit/miss counters of this worker's OCR cache, or None when it is disabled."""
+    return ocr_cache.stats() if ocr_cache else None
+
+
+def ocr_preprocess_stats():
+    """Bytes before/after image pre-processing in this worker."""
+    return preprocess_stats.stats()
+
+
+def ocr_source_counts():
+    """How many uploads this worker read via each path (text layer, cache, vision, ...)."""
+    with _source_lock:
+        return dict(_source_counts)
+
+
+def _counted(text, source):
+    with _source_lock:
+        _source_counts[source] += 1
+    return text, source
+
+
+def extract_pdf_text_layer(file_data):
+    """
+    Text of a PDF's embedded text layer, or None if it has too little to
+    trust: lab-generated PDFs carry one, scanned ones don't.
+    """
+    if PdfReader is None:
+        return None
+    try:
+        reader = PdfReader(pdf_stream(file_data))
+        text = "\n\n".join((page.extract_text() or "").strip() for page in reader.pages)
+    except Exception as e:
+        print(f"⚠️ Could not read PDF text layer ({e})")
+        return None
+    # "Structured" = enough rows that pair a label with a number, like "Hemoglobin 13.5 g/dL"
+    data_rows = sum(1 for line in text.splitlines() if _DATA_ROW.search(line))
+    if len(text) < OCR_TEXT_LAYER_MIN_CHARS or data_rows < OCR_TEXT_LAYER_MIN_ROWS:
+        return None
+    return text
+
+
+def extract_report_text(file_path, digest=None):
     """
-    Extract text from medical report images or PDFs using Gemini.
+    Extract text from medical report images or PDFs.
+    PDFs with a usable text layer are read locally; everything else goes to
+    Gemini vision, with results cached by the SHA-256 of the file (pass
+    `digest` if the caller already has it) so repeat uploads skip the call.
     Falls back to demo text if API unavailable.
+    Returns: (text, source) where source is one of OCR_SOURCES
     """
+    # PDFs are memory-mapped rather than read: the text-layer check, image
+    # shrinking and page splitting all parse the mapping in place
+    if file_path.lower().endswith('.pdf') and os.path.getsize(file_path):
+        with map_file(file_path) as file_data:
+            return _extract_report_text(file_path, digest, file_data)
+    return _extract_report_text(file_path, digest, None)
+
+
+def _extract_report_text(file_path, digest, file_data):
     filename = os.path.basename(file_path).lower()
+
+    if file_data is not None:
+        text = extract_pdf_text_layer(file_data)
+        if text:
+            print(f"Read {len(text)} characters from the PDF text layer: {filename}")
+            return _counted(text, "text-layer")
     
-    if API_WORKING and vision_model:
+    vision_model = get_model()
+    if vision_model:
+        if ocr_cache:
+            digest = digest or file_digest(file_path)
+            cached = ocr_cache.get(digest)
+            if cached is not None:
+                print(f"OCR cache hit for {filename} ({digest[:12]})")
+                return _counted(cached, "cache")
         try:
+            partial = False
             # Handle PDF vs Image
-            if filename.endswith('.pdf'):
+            if file_data is not None:
                 print(f"Processing PDF for OCR: {filename}")
-                # For PDFs, we can upload the file to Gemini or use the path if the SDK supports it
-                # In many environments, sending the file object or bytes is better
-                with open(file_path, "rb") as f:
-                    file_data = f.read()
-                
-                # Gemini 1.5 Flash can handle PDF blobs directly
-                content = [
-                    {
-                        "mime_type": "application/pdf",
-                        "data": file_data
-                    },
-                    "Extract ALL text from this medical laboratory report. Include test names, values, units, reference ranges, patient info, and dates. Transcribe exactly as shown, preserving the structure."
-                ]
-                response = vision_model.generate_content(content)
+                text, partial = ocr_pdf(file_data)
             else:
-                # Standard Image handling
-                image = Image.open(file_path)
-                prompt = (
-                    "Extract ALL text from this medical laboratory report. "
-                    "Include test names, values, units, reference ranges, patient info, and dates. "
-                    "Transcribe exactly as shown, preserving the structure."
-                )
-                response = vision_model.generate_content([prompt, image])
+                # Standard Image handling: rotated, grayscale and downscaled first
+                data, mime_type = preprocess_image_file(file_path)
+                response = vision_model.generate_content([OCR_PROMPT, {"mime_type": mime_type, "data": data}],
+                                                         generation_config=GENERATION_CONFIG)
+                text = response.text
             
-            text = response.text
             if text and len(text) > 50:
                 print(f"OCR extracted {len(text)} characters")
-                return text
+                # Text with unreadable-page placeholders is not cached, so a re-upload tries those pages again
+                if ocr_cache and not partial:
+                    ocr_cache.put(digest, text)
+                return _counted(text, "vision")
             else:
                 print(f"OCR returned insufficient text, using demo mode")
                 
         except Exception as e:
             print(f"OCR failed: {str(e)}. Using demo mode.")
     
-    print(f"DEBUG: OCR attempt for {filename}. API_WORKING={API_WORKING}")
+    print(f"DEBUG: OCR attempt for {filename}. API configured={api_configured()}")
     
     # If we get here, it means real OCR either failed or API is not configured
     # We will ONLY return demo text if the user is explicitly testing with our demo filenames
     # otherwise we return the raw text extracted or None
-    if not API_WORKING:
+    if not api_configured():
         print(f"⚠️ API Key missing/invalid for OCR. Demo fallback active for: {filename}")
-        return get_demo_ocr_text(filename)
+        return _counted(get_demo_ocr_text(filename), "demo")
     
     # If API is working but extraction failed, don't just give fake data unless it's a known demo file
-    return "ERROR: Could not extract text from this document. Please ensure it is a clear image of a medical report."
+    return _counted("ERROR: Could not extract text from this document. Please ensure it is a clear image of a medical report.", "error")
+
+
+def extract_text_from_image(file_path, digest=None):
+    """Text of a report image or PDF; see extract_report_text."""
+    return extract_report_text(file_path, digest)[0]
 
 
 def get_demo_ocr_text(filename):
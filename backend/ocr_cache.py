@@ -0,0 +1,125 @@
+"""
+LAB-LENS OCR Cache
+Content-addressed disk cache for extracted report text. Entries are keyed by
+the SHA-256 of the uploaded file's bytes, so re-uploading the same PDF or
+photo skips the vision model entirely. The cache directory is bounded to
+OCR_CACHE_MAX_BYTES with least-recently-used eviction: a hit touches the
+entry's mtime, so recency is shared by every gunicorn worker and survives
+restarts.
+"""
+import os
+import hashlib
+import threading
+
+from concurrency import write_file_atomic
+
+OCR_CACHE = os.getenv("OCR_CACHE", "true").lower() in ("1", "true", "yes")
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "ocr_cache")
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_MB", 256)) * 1024 * 1024
+
+# Eviction trims to this fraction of the bound so it doesn't rescan on every store
+EVICT_TO = 0.9
+HASH_CHUNK = 1024 * 1024
+
+
+def file_digest(file_path):
+    """SHA-256 hex digest of a file, read in chunks."""
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class OCRCache:
+    def __init__(self, directory=OCR_CACHE_DIR, max_bytes=OCR_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        # Approximate; other workers write here too, so eviction re-measures the directory
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def _path(self, digest):
+        # Two-level fan-out keeps directories small: ocr_cache/ab/abcdef....txt
+        return os.path.join(self.directory, digest[:2], digest + '.txt')
+
+    def _entries(self):
+        """(mtime_ns, size, path) for every cached entry."""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.txt'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue  # evicted by another worker mid-walk
+                entries.append((st.st_mtime_ns, st.st_size, path))
+        return entries
+
+    def get(self, digest):
+        """Cached text for a digest, or None. A hit marks the entry most recently used."""
+        path = self._path(digest)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, digest, text):
+        path = self._path(digest)
+        data = text.encode('utf-8')
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_file_atomic(path, data)
+        except OSError as e:
+            # A full or read-only disk must not fail the upload that produced the text
+            print(f"⚠️ OCR cache store failed for {digest[:12]}: {e}")
+            return
+        with self._lock:
+            self.stores += 1
+            self._size += len(data)
+            over = self._size > self.max_bytes
+        if over:
+            self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = sorted(self._entries())
+            size = sum(e[1] for e in entries)
+            target = self.max_bytes * EVICT_TO
+            for _, entry_size, path in entries:
+                if size <= target:
+                    break
+                try:
+                    os.remove(path)
+                    self.evictions += 1
+                except FileNotFoundError:
+                    pass
+                size -= entry_size
+            self._size = size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "bytes": self._size,
+                "maxBytes": self.max_bytes,
+            }
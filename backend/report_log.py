@@ -0,0 +1,589 @@
+"""
+LAB-LENS Report Log
+Append-only newline-delimited JSON store used when MongoDB is not configured.
+The log is a directory of time-ordered segments (00000001.jsonl, ...), each
+capped at REPORT_LOG_SEGMENT_BYTES and paired with a persistent id -> offset
+index (<segment>.idx). Lookups cost one seek, pages are served from an
+in-memory (createdAt, id) ordering, and reads only open the segments that
+hold the requested reports.
+
+Records are keyed by `id` by default (any field can be used, e.g. email for
+users). Re-appending a key supersedes the older record and delete() appends a
+tombstone; background compaction merges small sealed segments and drops the
+dead records. Appends from all workers are serialized by a file lock; appends
+from threads of the same worker that arrive during a commit share its write.
+"""
+import os
+import json
+import time
+import bisect
+import shutil
+import datetime
+import threading
+from concurrency import FileLock, GroupCommitter, write_file_atomic
+
+# A new segment is started once the active one reaches this size
+REPORT_LOG_SEGMENT_BYTES = int(os.getenv('REPORT_LOG_SEGMENT_BYTES', 4 * 1024 * 1024))
+# Seconds between background compaction passes (0 disables the thread)
+REPORT_LOG_COMPACT_INTERVAL_S = float(os.getenv('REPORT_LOG_COMPACT_INTERVAL_S', 600))
+
+SEGMENT_SUFFIX = '.jsonl'
+DELETED_FLAG = '_deleted'
+
+
+def segment_name(number):
+    return f"{number:08d}{SEGMENT_SUFFIX}"
+
+
+def segment_number(name):
+    stem = name[:-len(SEGMENT_SUFFIX)]
+    if name.endswith(SEGMENT_SUFFIX) and stem.isdigit():
+        return int(stem)
+    return None
+
+
+def encode_record(record):
+    return (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def line_entry(line, key='id'):
+    """(key, createdAt, deleted) of a log line; key is '' for unreadable lines."""
+    try:
+        record = json.loads(line)
+        report_id, created_at = record.get(key), record.get('createdAt')
+        deleted = bool(record.get(DELETED_FLAG))
+    except (ValueError, AttributeError):
+        return '', '', False
+    return (
+        '' if report_id is None else str(report_id),
+        '' if created_at is None else str(created_at).replace('\t', ' '),
+        deleted,
+    )
+
+
+def append_index_lines(index_path, entries):
+    """Single O_APPEND write, so concurrent workers never interleave lines."""
+    if not entries:
+        return
+    data = ''.join(
+        f"{offset}\t{length}\t{report_id}\t{created_at}\t{'D' if deleted else ''}\n"
+        for offset, length, report_id, created_at, deleted in entries
+    ).encode('utf-8')
+    try:
+        fd = os.open(index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        print(f"⚠️ Could not update {index_path}: {e}")
+
+
+class Segment:
+    """
+    One segment file plus its persistent index.
+    Index lines are "offset<TAB>length<TAB>id<TAB>createdAt<TAB>flag" and are only
+    trusted for the prefix of the segment they cover; anything past that is
+    scanned and appended, and a truncated or replaced file triggers a rebuild.
+    """
+
+    def __init__(self, path, number, key='id'):
+        self.path = path
+        self.number = number
+        self.key = key
+        self.index_path = path + '.idx'
+        self.entries = []        # (offset, length, id, createdAt, deleted) in file order
+        self.size = 0            # bytes of the segment covered by entries
+        self.signature = None    # (size, mtime_ns) at the last refresh
+        self.identity = self.stat_identity()
+        self._load_index()
+
+    def stat_identity(self):
+        try:
+            return os.stat(self.path).st_ino
+        except OSError:
+            return None
+
+    def _reset(self):
+        self.entries, self.size, self.signature = [], 0, None
+        try:
+            os.remove(self.index_path)
+        except OSError:
+            pass
+
+    def _load_index(self):
+        entries = []
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split('\t', 4)
+                    if len(parts) != 5:
+                        entries = []
+                        break
+                    entries.append((int(parts[0]), int(parts[1]), parts[2], parts[3], parts[4] == 'D'))
+        except (OSError, ValueError):
+            entries = []
+
+        seen = set()
+        for entry in sorted(entries):
+            if entry[0] in seen:
+                continue
+            seen.add(entry[0])
+            self.entries.append(entry)
+        if self.entries:
+            offset, length, report_id = self.entries[-1][:3]
+            self.size = offset + length
+            if not self._matches_file(offset, length, report_id):
+                print(f"⚠️ {self.index_path} does not match {self.path}; rebuilding index")
+                self._reset()
+        self.refresh()
+
+    def _matches_file(self, offset, length, report_id):
+        """Spot-check the last indexed line against the segment itself."""
+        try:
+            if os.path.getsize(self.path) < offset + length:
+                return False
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                line = f.readline()
+            return len(line) == length and line_entry(line, self.key)[0] == report_id
+        except OSError:
+            return False
+
+    def refresh(self):
+        """
+        Index lines appended since the last scan.
+        Returns the new entries, or None if the file shrank and was re-indexed from scratch.
+        """
+        try:
+            st = os.stat(self.path)
+            signature = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            signature = (0, 0)
+        if signature == self.signature:
+            return []
+
+        size = signature[0]
+        reset = size < self.size
+        if reset:
+            self._reset()
+
+        new_entries = []
+        if size > self.size:
+            with open(self.path, 'rb') as f:
+                f.seek(self.size)
+                offset = self.size
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # Partial line from an in-flight append; pick it up next time
+                        break
+                    new_entries.append((offset, len(line)) + line_entry(line, self.key))
+                    offset += len(line)
+                self.size = offset
+            self.entries.extend(new_entries)
+            append_index_lines(self.index_path, new_entries)
+
+        if size == self.size:
+            self.signature = signature
+        return None if reset else new_entries
+
+
+class ReportLog:
+    def __init__(self, directory, legacy_paths=(), key='id'):
+        self.directory = directory
+        self.key = key
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._segments = []       # Segment objects, oldest first
+        self._dir_signature = None
+        self._locations = {}      # record key -> (segment number, offset)
+        self._keys = {}           # record key -> (createdAt, key) sort key
+        self._by_time = []        # sorted (createdAt, id) keys, oldest first
+        self._file_lock = FileLock(os.path.join(directory, 'append'))
+        self._compact_lock = FileLock(os.path.join(directory, 'compact'))
+        self._committer = GroupCommitter(self._write_batch)
+
+        with self._file_lock:
+            self._migrate(legacy_paths)
+        with self._lock:
+            self._refresh()
+
+        if REPORT_LOG_COMPACT_INTERVAL_S > 0:
+            threading.Thread(target=self._compaction_loop, daemon=True).start()
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, segment_name(number))
+
+    def _segment_numbers_on_disk(self):
+        numbers = (segment_number(name) for name in os.listdir(self.directory))
+        return sorted(n for n in numbers if n is not None)
+
+    def _migrate(self, legacy_paths):
+        """
+        One-time import into an empty log directory. Accepts the old
+        single-file reports.jsonl or a reports.json array. Legacy files are
+        copied, never moved, so tracked seed files stay untouched.
+        """
+        if self._segment_numbers_on_disk():
+            return
+        for legacy_path in legacy_paths:
+            if not os.path.isfile(legacy_path):
+                continue
+            first_segment = self._segment_path(1)
+            if legacy_path.endswith(SEGMENT_SUFFIX):
+                tmp_path = first_segment + '.tmp'
+                shutil.copyfile(legacy_path, tmp_path)
+                os.replace(tmp_path, first_segment)
+                print(f"✓ Copied {legacy_path} into {self.directory}")
+                return
+
+            try:
+                with open(legacy_path, 'r') as f:
+                    reports = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Could not read {legacy_path} for migration: {e}")
+                continue
+            write_file_atomic(first_segment, b''.join(encode_record(r) for r in reports))
+            print(f"✓ Migrated {len(reports)} records from {legacy_path} to {self.directory}")
+            return
+
+    # --- In-memory index over all segments ---
+
+    def _reset_index(self):
+        self._locations, self._keys, self._by_time = {}, {}, []
+
+    def _forget(self, report_id):
+        old_key = self._keys.pop(report_id, None)
+        self._locations.pop(report_id, None)
+        if old_key is not None:
+            i = bisect.bisect_left(self._by_time, old_key)
+            if i < len(self._by_time) and self._by_time[i] == old_key:
+                self._by_time.pop(i)
+
+    def _apply(self, number, entries):
+        for offset, _, report_id, created_at, deleted in entries:
+            if not report_id:
+                continue
+            if deleted:
+                self._forget(report_id)
+                continue
+            key = (created_at, report_id)
+            if self._keys.get(report_id) != key:
+                self._forget(report_id)
+                self._keys[report_id] = key
+                bisect.insort(self._by_time, key)
+            self._locations[report_id] = (number, offset)
+
+    def _rescan_segments(self):
+        """Sync the segment list with the directory. Returns True if a full rebuild is needed."""
+        current = {seg.number: seg for seg in self._segments}
+        rebuild = False
+        segments = []
+        for number in self._segment_numbers_on_disk():
+            seg = current.pop(number, None)
+            if seg is not None and seg.identity != seg.stat_identity():
+                # Replaced by compaction
+                seg, rebuild = None, True
+            if seg is None:
+                seg = Segment(self._segment_path(number), number, self.key)
+                if self._segments and number < self._segments[-1].number:
+                    rebuild = True
+                elif not rebuild:
+                    self._apply(number, seg.entries)
+            segments.append(seg)
+        if current:
+            rebuild = True  # segments removed by compaction
+        self._segments = segments
+        return rebuild
+
+    def _refresh(self):
+        """Pick up appends, rotations and compactions made by any worker."""
+        try:
+            dir_signature = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            dir_signature = None
+
+        rebuild = False
+        changed = self._segments[-1:]
+        if dir_signature != self._dir_signature:
+            # Refresh already-known segments before adding new ones so records stay in order
+            for seg in self._segments:
+                if seg.identity == seg.stat_identity():
+                    new_entries = seg.refresh()
+                    if new_entries is None:
+                        rebuild = True
+                    elif not rebuild:
+                        self._apply(seg.number, new_entries)
+            rebuild = self._rescan_segments() or rebuild
+            self._dir_signature = dir_signature
+            changed = []
+
+        for seg in changed:
+            new_entries = seg.refresh()
+            if new_entries is None:
+                rebuild = True
+            else:
+                self._apply(seg.number, new_entries)
+
+        if rebuild:
+            self._reset_index()
+            for seg in self._segments:
+                self._apply(seg.number, seg.entries)
+
+    def _force_reload(self):
+        self._segments, self._dir_signature = [], None
+        self._reset_index()
+        self._refresh()
+
+    def _read_many(self, locations):
+        """Read records at (segment number, offset) locations, opening each segment once."""
+        records, files = [], {}
+        try:
+            for number, offset in locations:
+                f = files.get(number)
+                if f is None:
+                    f = files[number] = open(self._segment_path(number), 'rb')
+                f.seek(offset)
+                records.append(json.loads(f.readline()))
+        finally:
+            for f in files.values():
+                f.close()
+        return records
+
+    def _read_keys(self, keys):
+        """
+        Read the current records for (createdAt, id) keys. Retries once with a
+        full reload if compaction moved records under us.
+        """
+        for attempt in range(2):
+            with self._lock:
+                if attempt:
+                    self._force_reload()
+                else:
+                    self._refresh()
+                wanted = [report_id for _, report_id in keys if report_id in self._locations]
+                locations = [self._locations[report_id] for report_id in wanted]
+            try:
+                records = self._read_many(locations)
+            except (OSError, ValueError):
+                continue
+            if [str(r.get(self.key)) for r in records] == wanted:
+                return records
+        return []
+
+    # --- Writes ---
+
+    def _write_batch(self, lines):
+        """Durably append a batch of encoded lines to the active segment, rotating when full."""
+        with self._file_lock:
+            numbers = self._segment_numbers_on_disk()
+            number = numbers[-1] if numbers else 1
+            path = self._segment_path(number)
+            if numbers and os.path.getsize(path) >= REPORT_LOG_SEGMENT_BYTES:
+                number += 1
+                path = self._segment_path(number)
+            with open(path, 'ab') as f:
+                f.write(b''.join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def append(self, report):
+        """Append one report (superseding any older record with the same id)."""
+        self._committer.submit(encode_record(report))
+        with self._lock:
+            self._refresh()
+        return True
+
+    def append_many(self, reports):
+        """Append several reports in a single durable write."""
+        if not reports:
+            return True
+        self._committer.submit(b''.join(encode_record(r) for r in reports))
+        with self._lock:
+            self._refresh()
+        return True
+
+    def delete(self, report_id):
+        """Append a tombstone for `report_id`. Returns False if it was not stored."""
+        with self._lock:
+            self._refresh()
+            if str(report_id) not in self._locations:
+                return False
+        self._committer.submit(encode_record({
+            self.key: str(report_id),
+            DELETED_FLAG: True,
+            "createdAt": datetime.datetime.now().isoformat(),
+        }))
+        with self._lock:
+            self._refresh()
+        return True
+
+    # --- Reads ---
+
+    def get(self, report_id):
+        report_id = str(report_id)
+        with self._lock:
+            self._refresh()
+            key = self._keys.get(report_id)
+        if key is None:
+            return None
+        records = self._read_keys([key])
+        return records[0] if records else None
+
+    def get_many(self, report_ids):
+        """The live reports among `report_ids`, oldest first; unknown ids are skipped."""
+        with self._lock:
+            self._refresh()
+            keys = sorted(self._keys[i] for i in map(str, report_ids) if i in self._keys)
+        return self._read_keys(keys) if keys else []
+
+    def ids(self):
+        """Set of live record keys."""
+        with self._lock:
+            self._refresh()
+            return set(self._keys)
+
+    def all(self):
+        """All live reports, oldest first by (createdAt, id)."""
+        with self._lock:
+            self._refresh()
+            keys = list(self._by_time)
+        return self._read_keys(keys) if keys else []
+
+    def page(self, limit, cursor=None):
+        """
+        Newest-first page of reports ordered by (createdAt, id).
+        `cursor` is the (createdAt, id) of the last report of the previous page.
+        Returns: (reports, next_cursor or None)
+        """
+        with self._lock:
+            self._refresh()
+            end = len(self._by_time)
+            if cursor is not None:
+                end = bisect.bisect_left(self._by_time, tuple(cursor))
+            start = max(0, end - limit)
+            keys = self._by_time[start:end][::-1]
+
+        reports = self._read_keys(keys) if keys else []
+        next_cursor = keys[-1] if keys and start > 0 else None
+        return reports, next_cursor
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._by_time)
+
+    # --- Compaction ---
+
+    def compact(self):
+        """
+        Merge runs of small sealed segments and drop superseded or deleted
+        records. The active (newest) segment is never touched.
+        Returns the number of bytes reclaimed.
+        """
+        removed = reclaimed = 0
+        with self._compact_lock:
+            with self._lock:
+                self._force_reload()
+                segments = list(self._segments)
+                locations = dict(self._locations)
+
+            ids_before, scanned = set(), 0
+            for group in self._plan_compaction(segments[:-1], locations):
+                while segments[scanned].number < group[0].number:
+                    ids_before.update(entry[2] for entry in segments[scanned].entries)
+                    scanned += 1
+                files, freed = self._merge(group, locations, ids_before)
+                removed += files
+                reclaimed += freed
+
+        if reclaimed:
+            with self._lock:
+                self._refresh()
+            print(f"✓ Compacted report log: reclaimed {reclaimed} bytes, {removed} segment(s) merged away")
+        return reclaimed
+
+    @staticmethod
+    def _live_bytes(seg, locations):
+        return sum(
+            length for offset, length, report_id, _, deleted in seg.entries
+            if deleted or locations.get(report_id) == (seg.number, offset)
+        )
+
+    def _plan_compaction(self, sealed, locations):
+        """Group consecutive sealed segments that are small or hold dead records."""
+        groups, group, group_bytes, group_dead = [], [], 0, False
+
+        def close_group():
+            if len(group) > 1 or group_dead:
+                groups.append(group)
+
+        for seg in sealed:
+            live = self._live_bytes(seg, locations)
+            dead = live < seg.size
+            worth_it = seg.size < REPORT_LOG_SEGMENT_BYTES // 2 or dead
+            if worth_it and group_bytes + live <= REPORT_LOG_SEGMENT_BYTES:
+                group.append(seg)
+                group_bytes += live
+                group_dead = group_dead or dead
+                continue
+            close_group()
+            if worth_it:
+                group, group_bytes, group_dead = [seg], live, dead
+            else:
+                group, group_bytes, group_dead = [], 0, False
+        close_group()
+        return groups
+
+    def _merge(self, group, locations, ids_before):
+        target = group[0]
+        tmp_path = os.path.join(self.directory, f"compact-{os.getpid()}.tmp")
+        new_entries, offset = [], 0
+        with open(tmp_path, 'wb') as out:
+            for seg in group:
+                with open(seg.path, 'rb') as f:
+                    for entry_offset, length, report_id, created_at, deleted in seg.entries:
+                        if deleted:
+                            # Only needed while an older segment still holds the id
+                            keep = report_id in ids_before and report_id not in locations
+                        else:
+                            keep = locations.get(report_id) == (seg.number, entry_offset)
+                        if not keep:
+                            continue
+                        f.seek(entry_offset)
+                        out.write(f.read(length))
+                        new_entries.append((offset, length, report_id, created_at, deleted))
+                        offset += length
+            out.flush()
+            os.fsync(out.fileno())
+
+        index_tmp = tmp_path + '.idx'
+        try:
+            os.remove(index_tmp)
+        except OSError:
+            pass
+        append_index_lines(index_tmp, new_entries)
+
+        with self._file_lock:
+            if new_entries:
+                os.replace(index_tmp, target.index_path)
+                os.replace(tmp_path, target.path)
+                doomed = group[1:]
+            else:
+                os.remove(tmp_path)
+                doomed = group
+            for seg in doomed:
+                for path in (seg.path, seg.index_path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        return len(doomed), sum(seg.size for seg in group) - offset
+
+    def _compaction_loop(self):
+        while True:
+            time.sleep(REPORT_LOG_COMPACT_INTERVAL_S)
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"⚠️ Report log compaction failed: {e}")
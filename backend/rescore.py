@@ -0,0 +1,204 @@
+"""
+LAB-LENS Bulk Re-scoring
+Re-runs calculate_risk_level over every stored report after the reference
+ranges in severity.py change, so old reports stop showing stale test
+statuses and abnormal counts. The overall risk, banner and specialist are
+left as stored: they may come from the AI's reading of the report, which
+re-scoring cannot reproduce.
+
+Reports are streamed newest-first from MongoDB (or the local report log),
+scored across a process pool, and written back one batch at a time. After
+each batch the (createdAt, id) position is saved to a checkpoint file, so an
+interrupted run picks up where it stopped. Only reports whose
+riskSummary.referenceVersion differs from the loaded reference data are
+re-scored unless --all is given.
+
+Usage (from backend/):
+    python rescore.py [--workers N] [--batch-size N] [--all] [--dry-run] [--restart]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from severity import REFERENCE_VERSION, calculate_risk_level
+
+REPORTS_LOG_DIR = 'reports_log'
+REPORT_SUMMARIES_DIR = 'report_summaries'
+CHECKPOINT_FILE = 'rescore.checkpoint.json'
+DEFAULT_BATCH_SIZE = 1000
+# riskSummary fields that follow from the test statuses alone
+RESCORED_FIELDS = ('abnormalCount', 'referenceVersion')
+
+
+def is_stale(report):
+    """True if the report was scored against other reference data than the loaded one."""
+    return (report.get('riskSummary') or {}).get('referenceVersion') != REFERENCE_VERSION
+
+
+def rescore_report(report):
+    """
+    Worker: recompute test statuses, abnormalCount and referenceVersion for one report.
+    Returns: (id, tests, riskSummary, changed)
+    """
+    old_tests = report.get('tests') or []
+    old_statuses = [t.get('status') for t in old_tests]
+    tests = [dict(t) for t in old_tests]
+    computed, tests = calculate_risk_level(tests)
+
+    old_summary = report.get('riskSummary') or {}
+    risk_summary = dict(old_summary)
+    for field in RESCORED_FIELDS:
+        risk_summary[field] = computed[field]
+
+    changed = [t.get('status') for t in tests] != old_statuses or risk_summary != old_summary
+    return report.get('id'), tests, risk_summary, changed
+
+
+class MongoSource:
+    def __init__(self, db):
+        self.reports = db['reports']
+        self.summaries = db['report_summaries']
+
+    def page(self, limit, cursor, stale_only=False):
+        clauses = []
+        if cursor:
+            created_at, report_id = cursor
+            clauses.append({"$or": [
+                {"createdAt": {"$lt": created_at}},
+                {"createdAt": created_at, "id": {"$lt": report_id}},
+            ]})
+        if stale_only:
+            clauses.append({"riskSummary.referenceVersion": {"$ne": REFERENCE_VERSION}})
+        query = {"$and": clauses} if clauses else {}
+        projection = {'_id': 0, 'id': 1, 'createdAt': 1, 'tests': 1, 'riskSummary': 1}
+        return list(self.reports.find(query, projection).sort([('createdAt', -1), ('id', -1)]).limit(limit))
+
+    def write(self, results):
+        from pymongo import UpdateOne
+        self.reports.bulk_write([
+            UpdateOne({"id": report_id}, {"$set": {"tests": tests, "riskSummary": risk_summary}})
+            for report_id, tests, risk_summary in results
+        ], ordered=False)
+        self.summaries.bulk_write([
+            UpdateOne({"id": report_id}, {"$set": {"abnormalCount": risk_summary.get('abnormalCount')}})
+            for report_id, _, risk_summary in results
+        ], ordered=False)
+
+
+class LocalSource:
+    def __init__(self):
+        from report_log import ReportLog
+        self.reports = ReportLog(REPORTS_LOG_DIR)
+        self.summaries = ReportLog(REPORT_SUMMARIES_DIR)
+
+    def page(self, limit, cursor, stale_only=False):
+        # Filtered by the caller; the log has no secondary index on version
+        reports, _ = self.reports.page(limit, cursor)
+        return reports
+
+    def write(self, results):
+        updated, summaries = [], []
+        for report_id, tests, risk_summary in results:
+            report = self.reports.get(report_id)
+            if report is None:
+                continue  # deleted since it was read
+            report['tests'] = tests
+            report['riskSummary'] = risk_summary
+            updated.append(report)
+            summary = self.summaries.get(report_id)
+            if summary is not None:
+                summary['abnormalCount'] = risk_summary.get('abnormalCount')
+                summaries.append(summary)
+        self.reports.append_many(updated)
+        self.summaries.append_many(summaries)
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except ValueError:
+        print(f"⚠️ Ignoring unreadable checkpoint {path}")
+        return None
+
+
+def save_checkpoint(path, state):
+    from concurrency import write_file_atomic
+    write_file_atomic(path, json.dumps(state).encode('utf-8'))
+
+
+def open_source():
+    from mongo_client import get_db
+    db = get_db()
+    if db is not None:
+        return MongoSource(db), "MongoDB"
+    return LocalSource(), "local report log"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score stored reports against the current reference ranges.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes (default: all cores)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="reports per read/write-back batch")
+    parser.add_argument('--all', action='store_true', help="re-score reports already at the current reference version too")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE, help="resume file (default: %(default)s)")
+    parser.add_argument('--restart', action='store_true', help="ignore any existing checkpoint")
+    parser.add_argument('--dry-run', action='store_true', help="score and count changes without writing")
+    args = parser.parse_args(argv)
+
+    state = None if args.restart else load_checkpoint(args.checkpoint)
+    if state:
+        print(f"✓ Resuming after {state['processed']} reports (checkpoint {args.checkpoint})")
+    else:
+        state = {"cursor": None, "processed": 0, "changed": 0}
+
+    # Spawned workers import only severity.py; no database handles cross the fork
+    pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'))
+    source, source_name = open_source()
+    scope = "all reports" if args.all else f"reports not scored against reference version {REFERENCE_VERSION}"
+    print(f"Re-scoring {scope} from {source_name} with {args.workers} worker(s)")
+
+    started = time.monotonic()
+    try:
+        while True:
+            reports = source.page(args.batch_size, state['cursor'], stale_only=not args.all)
+            if not reports:
+                break
+            todo = reports if args.all else [r for r in reports if is_stale(r)]
+            chunksize = max(1, len(todo) // (args.workers * 4))
+            results = [r for r in pool.map(rescore_report, todo, chunksize=chunksize) if r[3]]
+            if results and not args.dry_run:
+                source.write([r[:3] for r in results])
+
+            last = reports[-1]
+            state['cursor'] = [last.get('createdAt') or '', str(last.get('id'))]
+            state['processed'] += len(todo)
+            state['changed'] += len(results)
+            if not args.dry_run:
+                save_checkpoint(args.checkpoint, state)
+            rate = state['processed'] / max(time.monotonic() - started, 1e-9)
+            print(f"  {state['processed']} scored, {state['changed']} changed ({rate:.0f} reports/s)")
+    except KeyboardInterrupt:
+        print(f"\n⚠️ Interrupted; rerun to resume from {args.checkpoint}")
+        return 1
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+    if os.path.exists(args.checkpoint) and not args.dry_run:
+        os.remove(args.checkpoint)
+    verb = "would change" if args.dry_run else "updated"
+    print(f"✅ Re-scored {state['processed']} reports; {verb} {state['changed']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
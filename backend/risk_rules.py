@@ -0,0 +1,128 @@
+"""
+LAB-LENS Risk Rules
+Loads the declarative overall-risk rules (risk_rules.json) and compiles them
+once into flat tuples that calculate_risk_level walks in a single pass.
+The file is re-checked by mtime every RISK_RULES_CHECK_S seconds, so edits
+take effect in running gunicorn workers without a restart; a broken edit is
+reported and the previous rules stay active.
+"""
+import os
+import json
+import time
+import threading
+
+RISK_RULES_FILE = os.getenv(
+    "RISK_RULES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "risk_rules.json")
+)
+RISK_RULES_CHECK_S = float(os.getenv("RISK_RULES_CHECK_S", 5))
+
+# Conditions a level may require; each is a minimum
+LEVEL_CONDITIONS = ("maxWeight", "totalWeight", "abnormalCount")
+OUTCOME_FIELDS = ("overallRisk", "bannerMessage", "severityBannerColor", "recommendedSpecialist")
+
+
+class CompiledRules:
+    """
+    weights: {term: weight} for abnormal tests whose name contains the term
+    levels: ((min_max_weight, min_total_weight, min_abnormal, outcome), ...) first match wins
+    ai_banners: ((substring, outcome), ...) first match wins
+    """
+    __slots__ = ("version", "default_weight", "weights", "specialist_priority",
+                 "default_priority", "default_specialist", "levels", "ai_banners")
+
+    def classify(self, max_weight, total_weight, abnormal_count):
+        for min_max, min_total, min_count, outcome in self.levels:
+            if max_weight >= min_max and total_weight >= min_total and abnormal_count >= min_count:
+                return outcome
+        return self.levels[-1][3]
+
+    def ai_banner(self, ai_risk):
+        for needle, outcome in self.ai_banners:
+            if needle in ai_risk:
+                return outcome
+        return None
+
+
+def _outcome(entry):
+    return {field: entry[field] for field in OUTCOME_FIELDS if field in entry}
+
+
+def compile_rules(data):
+    """Validate a parsed rules document and compile it. Raises ValueError on bad input."""
+    rules = CompiledRules()
+    rules.version = str(data["version"])
+    rules.default_weight = float(data.get("defaultWeight", 1))
+    rules.weights = {str(term).lower(): float(weight) for term, weight in data.get("weights", {}).items()}
+    rules.specialist_priority = {str(k): float(v) for k, v in data.get("specialistPriority", {}).items()}
+    rules.default_priority = float(data.get("defaultPriority", 1))
+    rules.default_specialist = data.get("defaultSpecialist", "General Physician")
+
+    levels = []
+    for level in data["levels"]:
+        when = level.get("when", {})
+        unknown = set(when) - set(LEVEL_CONDITIONS)
+        if unknown:
+            raise ValueError(f"unknown level condition(s): {sorted(unknown)}")
+        if "overallRisk" not in level:
+            raise ValueError("every level needs an overallRisk")
+        levels.append((
+            float(when.get("maxWeight", 0)),
+            float(when.get("totalWeight", 0)),
+            int(when.get("abnormalCount", 0)),
+            _outcome(level),
+        ))
+    if not levels or any(levels[-1][:3]):
+        raise ValueError("the last level must have no conditions (it is the fallback)")
+    rules.levels = tuple(levels)
+
+    rules.ai_banners = tuple((str(b.get("contains", "")), _outcome(b)) for b in data.get("aiRiskBanners", []))
+    return rules
+
+
+def load_rules(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return compile_rules(json.load(f))
+
+
+class RiskRules:
+    """Hot-reloading holder for the compiled rules of one file."""
+
+    def __init__(self, path=RISK_RULES_FILE, check_interval_s=RISK_RULES_CHECK_S):
+        self.path = path
+        self.check_interval = check_interval_s
+        self._rules = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def _file_signature(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def current(self):
+        """The compiled rules, reloaded first if the file changed since the last check."""
+        now = time.monotonic()
+        if self._rules is not None and now - self._checked_at < self.check_interval:
+            return self._rules
+        with self._lock:
+            if self._rules is None or now - self._checked_at >= self.check_interval:
+                self._reload_if_changed()
+                self._checked_at = now
+        return self._rules
+
+    def _reload_if_changed(self):
+        try:
+            signature = self._file_signature()
+            if signature == self._signature:
+                return
+            rules = load_rules(self.path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if self._rules is None:
+                raise
+            print(f"⚠️ Keeping risk rules v{self._rules.version}; could not reload {self.path}: {e}")
+            return
+        if self._rules is not None:
+            print(f"✓ Reloaded risk rules v{rules.version} from {self.path}")
+        self._rules, self._signature = rules, signature
+        self.reloads += 1
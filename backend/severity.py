@@ -4,193 +4,435 @@ A comprehensive reference engine for clinical values across all common report ty
 Acts as a grounding layer for AI-extracted data.
 """
 
+import os
 import re
+import json
+import threading
+from functools import lru_cache
 
+from risk_rules import RiskRules
 
-# --- RADIALLY EXPANDED MEDICAL DATASET (100+ TESTS) ---
-# Format: "key": {"M": [low, high], "F": [low, high], "unit": "unit", "category": "cat", "specialist": "spec", "priority": "P"}
-
-MASTER_REFERENCE_DICTIONARY = {
-    # 🩸 HEMATOLOGY (1-30)
-    "wbc": {"M": [4.0, 11.0], "F": [4.0, 11.0], "unit": "x10^9/L", "category": "Hematology", "specialist": "Hematologist", "priority": "Medium", "purpose": "Leukocyte count. High indicates infection/inflammation."},
-    "rbc": {"M": [4.5, 5.9], "F": [4.1, 5.1], "unit": "x10^12/L", "category": "Hematology", "specialist": "Hematologist", "priority": "Routine", "purpose": "Red blood cell count. Low indicates anemia."},
-    "hemoglobin": {"M": [13.2, 16.6], "F": [11.6, 15.0], "unit": "g/dL", "category": "Hematology", "specialist": "Hematologist", "priority": "High", "purpose": "Oxygen carrying protein."},
-    "haemoglobin": {"M": [13.2, 16.6], "F": [11.6, 15.0], "unit": "g/dL", "category": "Hematology", "specialist": "Hematologist", "priority": "High"},
-    "hematocrit": {"M": [38.3, 48.6], "F": [35.5, 44.9], "unit": "%", "category": "Hematology", "specialist": "Hematologist", "priority": "Routine", "purpose": "Packed cell volume (PCV)."},
-    "pcv": {"M": [38.3, 48.6], "F": [35.5, 44.9], "unit": "%", "category": "Hematology", "specialist": "Hematologist", "priority": "Routine"},
-    "platelet": {"M": [150, 450], "F": [150, 450], "unit": "x10^9/L", "category": "Hematology", "specialist": "Hematologist", "priority": "High", "purpose": "Thrombocyte count. Essential for clotting."},
-    "esr": {"M": [0, 22], "F": [0, 29], "unit": "mm/hr", "category": "Hematology", "specialist": "Rheumatologist", "priority": "Routine", "purpose": "Erythrocyte Sedimentation Rate. Inflammation marker."},
-    "reticulocyte": {"M": [0.5, 2.5], "F": [0.5, 2.5], "unit": "%", "category": "Hematology", "specialist": "Hematologist", "priority": "Routine", "purpose": "Immature red blood cell count."},
-    "mcv": {"M": [80, 100], "F": [80, 100], "unit": "fL", "category": "Hematology", "specialist": "Hematologist", "priority": "Routine", "purpose": "Mean Corpuscular Volume. Sizing of RBCs."},
-    "mch": {"M": [27, 33], "F": [27, 33], "unit": "pg", "category": "Hematology", "specialist": "Hematologist", "priority": "Routine", "purpose": "Mean Corpuscular Hemoglobin."},
-    "mchc": {"M": [32, 36], "F": [32, 36], "unit": "g/dL", "category": "Hematology", "specialist": "Hematologist", "priority": "Routine", "purpose": "Mean Corpuscular Hemoglobin Conc."},
-    "anc": {"M": [1500, 7500], "F": [1500, 7500], "unit": "cells/mcL", "category": "Hematology", "specialist": "Hematologist", "priority": "High", "purpose": "Absolute Neutrophil Count."},
-    "alc": {"M": [1300, 3500], "F": [1300, 3500], "unit": "cells/mcL", "category": "Hematology", "specialist": "Hematologist", "priority": "Medium", "purpose": "Absolute Lymphocyte Count."},
-    "absolute monocyte": {"M": [200, 950], "F": [200, 950], "unit": "cells/mcL", "category": "Hematology", "specialist": "Hematologist", "priority": "Routine"},
-    "absolute eosinophil": {"M": [0, 500], "F": [0, 500], "unit": "cells/mcL", "category": "Hematology", "specialist": "Allergist", "priority": "Routine"},
-    "absolute basophil": {"M": [0, 300], "F": [0, 300], "unit": "cells/mcL", "category": "Hematology", "specialist": "Hematologist", "priority": "Routine"},
-    "segmented neutrophils": {"M": [50, 62], "F": [50, 62], "unit": "%", "category": "Hematology", "specialist": "Hematopathologist", "priority": "Medium"},
-    "mpv": {"M": [7.8, 11.0], "F": [7.8, 11.0], "unit": "fL", "category": "Hematology", "specialist": "Hematologist", "priority": "Routine", "purpose": "Mean Platelet Volume."},
-    "pct": {"M": [0.12, 0.50], "F": [0.12, 0.50], "unit": "%", "category": "Hematology", "specialist": "Hematologist", "priority": "Routine", "purpose": "Plateletcrit."},
-    "pdw": {"M": [9, 17], "F": [9, 17], "unit": "%", "category": "Hematology", "specialist": "Hematologist", "priority": "Routine", "purpose": "Platelet Distribution Width."},
-    "rdw-cv": {"M": [11, 15], "F": [11, 15], "unit": "%", "category": "Hematology", "specialist": "Hematologist", "priority": "Routine"},
-    "rdw-sd": {"M": [39, 46], "F": [39, 46], "unit": "fL", "category": "Hematology", "specialist": "Hematologist", "priority": "Routine"},
-
-    # 🧪 BIOCHEMISTRY & DIABETES (31-60)
-    "fasting glucose": {"M": [70, 99], "F": [70, 99], "unit": "mg/dL", "category": "Biochemistry", "specialist": "Endocrinologist", "priority": "High", "purpose": "Diabetes screening."},
-    "random glucose": {"M": [80, 140], "F": [80, 140], "unit": "mg/dL", "category": "Biochemistry", "specialist": "Endocrinologist", "priority": "High"},
-    "glucose": {"M": [70, 140], "F": [70, 140], "unit": "mg/dL", "category": "Biochemistry", "specialist": "Endocrinologist", "priority": "High"},
-    "hba1c": {"M": [4.0, 5.6], "F": [4.0, 5.6], "unit": "%", "category": "Biochemistry", "specialist": "Endocrinologist", "priority": "High", "purpose": "Average sugar."},
-    "insulin": {"M": [2, 25], "F": [2, 25], "unit": "µIU/mL", "category": "Biochemistry", "specialist": "Endocrinologist", "priority": "Medium"},
-    "c-peptide": {"M": [0.5, 2.0], "F": [0.5, 2.0], "unit": "ng/mL", "category": "Biochemistry", "specialist": "Endocrinologist", "priority": "Medium"},
-    "creatinine": {"M": [0.7, 1.3], "F": [0.6, 1.1], "unit": "mg/dL", "category": "Biochemistry", "specialist": "Nephrologist", "priority": "High"},
-    "urea": {"M": [15, 50], "F": [15, 50], "unit": "mg/dL", "category": "Biochemistry", "specialist": "Nephrologist", "priority": "Medium"},
-    "bun": {"M": [7, 20], "F": [7, 20], "unit": "mg/dL", "category": "Biochemistry", "specialist": "Nephrologist", "priority": "Medium"},
-    "uric acid": {"M": [3.4, 7.0], "F": [2.4, 6.0], "unit": "mg/dL", "category": "Biochemistry", "specialist": "Rheumatologist", "priority": "Medium"},
-    "total protein": {"M": [6.0, 8.3], "F": [6.0, 8.3], "unit": "g/dL", "category": "Biochemistry", "specialist": "Internal Medicine", "priority": "Routine"},
-    "ast": {"M": [8, 48], "F": [8, 48], "unit": "U/L", "category": "LFT", "specialist": "Hepatologist", "priority": "Medium"},
-    "alt": {"M": [7, 56], "F": [7, 56], "unit": "U/L", "category": "LFT", "specialist": "Hepatologist", "priority": "Medium"},
-    "alp": {"M": [40, 129], "F": [40, 129], "unit": "U/L", "category": "LFT", "specialist": "Gastroenterologist", "priority": "Medium"},
-    "ggt": {"M": [9, 48], "F": [9, 48], "unit": "U/L", "category": "LFT", "specialist": "Hepatologist", "priority": "Routine"},
-    "total bilirubin": {"M": [0.3, 1.9], "F": [0.3, 1.9], "unit": "mg/dL", "category": "LFT", "specialist": "Hepatologist", "priority": "Medium"},
-    "direct bilirubin": {"M": [0.0, 0.3], "F": [0.0, 0.3], "unit": "mg/dL", "category": "LFT", "specialist": "Hepatologist", "priority": "Medium"},
-    "albumin": {"M": [3.5, 5.5], "F": [3.5, 5.5], "unit": "g/dL", "category": "LFT", "specialist": "Hepatologist", "priority": "Routine"},
-    "globulin": {"M": [2.0, 3.5], "F": [2.0, 3.5], "unit": "g/dL", "category": "LFT", "specialist": "Hepatologist", "priority": "Routine"},
-    "ldh": {"M": [140, 280], "F": [140, 280], "unit": "U/L", "category": "LFT", "specialist": "Hepatologist", "priority": "Routine"},
-
-    # 🧪 TOXICOLOGY & DRUG SCREENING (61-90)
-    "noroxycodone": {"M": [0, 50], "F": [0, 50], "unit": "ng/mL", "category": "Toxicology", "specialist": "Toxicologist", "priority": "High", "purpose": "Oxycodone metabolite."},
-    "oxycodone": {"M": [0, 50], "F": [0, 50], "unit": "ng/mL", "category": "Toxicology", "specialist": "Toxicologist", "priority": "High"},
-    "morphine": {"M": [0, 95], "F": [0, 95], "unit": "ng/mL", "category": "Toxicology", "specialist": "Toxicologist", "priority": "High"},
-    "oxymorphone": {"M": [0, 50], "F": [0, 50], "unit": "ng/mL", "category": "Toxicology", "specialist": "Toxicologist", "priority": "High"},
-    "ethyl sulfate": {"M": [0, 200], "F": [0, 200], "unit": "ng/mL", "category": "Toxicology", "specialist": "Addiction Medicine Specialist", "priority": "Medium", "purpose": "Alcohol metabolite (EtS)."},
-    "ets": {"M": [0, 200], "F": [0, 200], "unit": "ng/mL", "category": "Toxicology", "specialist": "Addiction Medicine Specialist", "priority": "Medium"},
-    "ethyl glucuronide": {"M": [0, 500], "F": [0, 500], "unit": "ng/mL", "category": "Toxicology", "specialist": "Addiction Medicine Specialist", "priority": "Medium", "purpose": "Alcohol metabolite (EtG)."},
-    "etg": {"M": [0, 500], "F": [0, 500], "unit": "ng/mL", "category": "Toxicology", "specialist": "Addiction Medicine Specialist", "priority": "Medium"},
-    "thc": {"M": [0, 50], "F": [0, 50], "unit": "ng/mL", "category": "Toxicology", "specialist": "Addiction Medicine Specialist", "priority": "High", "purpose": "Cannabis screening."},
-    "opiates": {"M": [0, 300], "F": [0, 300], "unit": "ng/mL", "category": "Toxicology", "specialist": "Toxicologist", "priority": "High"},
-    "urine ph": {"M": [5.0, 9.0], "F": [5.0, 9.0], "unit": "pH", "category": "Urinalysis", "specialist": "Urologist", "priority": "Routine"},
-    "specific gravity": {"M": [1.003, 1.030], "F": [1.003, 1.030], "unit": "sg", "category": "Urinalysis", "specialist": "Nephrologist", "priority": "Routine"},
-    "oxidants": {"M": [0, 200], "F": [0, 200], "unit": "µg/mL", "category": "Toxicology", "specialist": "Toxicologist", "priority": "Medium"},
-    "benzodiazepines": {"M": [0, 200], "F": [0, 200], "unit": "ng/mL", "category": "Toxicology", "specialist": "Addiction Medicine Specialist", "priority": "High"},
-    "barbiturates": {"M": [0, 200], "F": [0, 200], "unit": "ng/mL", "category": "Toxicology", "specialist": "Toxicologist", "priority": "High"},
-    "fentanyl": {"M": [0, 1.0], "F": [0, 1.0], "unit": "ng/mL", "category": "Toxicology", "specialist": "Toxicologist", "priority": "High"},
-    "methadone": {"M": [0, 300], "F": [0, 300], "unit": "ng/mL", "category": "Toxicology", "specialist": "Addiction Medicine Specialist", "priority": "High"},
-    "mdma": {"M": [0, 500], "F": [0, 500], "unit": "ng/mL", "category": "Toxicology", "specialist": "Toxicologist", "priority": "High"},
-    "lsd": {"M": [0, 0.5], "F": [0, 0.5], "unit": "ng/mL", "category": "Toxicology", "specialist": "Toxicologist", "priority": "High"},
-    "cocaine": {"M": [0, 150], "F": [0, 150], "unit": "ng/mL", "category": "Toxicology", "specialist": "Toxicologist", "priority": "High"},
-    "ketamine": {"M": [0, 50], "F": [0, 50], "unit": "ng/mL", "category": "Toxicology", "specialist": "Toxicologist", "priority": "High"},
-
-    # 🧬 AUTOIMMUNE & RHEUMATOLOGY (91-120)
-    "ana": {"M": [0, 1.0], "F": [0, 1.0], "unit": "titer/index", "category": "Autoimmune", "specialist": "Rheumatologist", "priority": "High", "purpose": "Antinuclear Antibody. Lupus screening."},
-    "anti-dsdna": {"M": [0, 30], "F": [0, 30], "unit": "IU/mL", "category": "Autoimmune", "specialist": "Rheumatologist", "priority": "High"},
-    "anti-ccp": {"M": [0, 20], "F": [0, 20], "unit": "U/mL", "category": "Autoimmune", "specialist": "Rheumatologist", "priority": "High", "purpose": "Rheumatoid Arthritis marker."},
-    "rf": {"M": [0, 14], "F": [0, 14], "unit": "IU/mL", "category": "Autoimmune", "specialist": "Rheumatologist", "priority": "Medium", "purpose": "Rheumatoid Factor."},
-    "hla-b27": {"M": [0, 0], "F": [0, 0], "unit": "Binary", "category": "Autoimmune", "specialist": "Rheumatologist", "priority": "High"},
-    "complement c3": {"M": [80, 180], "F": [80, 180], "unit": "mg/dL", "category": "Autoimmune", "specialist": "Immunologist", "priority": "Medium"},
-    "complement c4": {"M": [15, 45], "F": [15, 45], "unit": "mg/dL", "category": "Autoimmune", "specialist": "Immunologist", "priority": "Medium"},
-    "anti-smith": {"M": [0, 1.0], "F": [0, 1.0], "unit": "Index", "category": "Autoimmune", "specialist": "Rheumatologist", "priority": "High"},
-    "anti-mitochondrial": {"M": [0, 0.1], "F": [0, 0.1], "unit": "Titer", "category": "Autoimmune", "specialist": "Hepatologist", "priority": "High"},
-
-    # 🦠 INFECTIOUS DISEASE (121-150)
-    "hiv viral load": {"M": [0, 20], "F": [0, 20], "unit": "copies/mL", "category": "Infectious Disease", "specialist": "HIV/AIDS Care Specialist", "priority": "High"},
-    "hbv-dna": {"M": [0, 10], "F": [0, 10], "unit": "IU/mL", "category": "Infectious Disease", "specialist": "Hepatologist", "priority": "High"},
-    "hcv rna": {"M": [0, 15], "F": [0, 15], "unit": "IU/mL", "category": "Infectious Disease", "specialist": "Hepatologist", "priority": "High"},
-    "tb quantiferon": {"M": [0, 0.35], "F": [0, 0.35], "unit": "IU/mL", "category": "Infectious Disease", "specialist": "Pulmonologist", "priority": "High"},
-    "malaria pcr": {"M": [0, 0], "F": [0, 0], "unit": "Binary", "category": "Infectious Disease", "specialist": "Travel & Tropical Medicine Expert", "priority": "High"},
-    "leptospira": {"M": [0, 1.0], "F": [0, 1.0], "unit": "Index", "category": "Infectious Disease", "specialist": "Infectious Disease Specialist", "priority": "Medium"},
-    "brucella": {"M": [0, 1.0], "F": [0, 1.0], "unit": "Index", "category": "Infectious Disease", "specialist": "Infectious Disease Specialist", "priority": "Medium"},
-    "chlamydia": {"M": [0, 0], "F": [0, 0], "unit": "Binary", "category": "Infectious Disease", "specialist": "Sexual Medicine Specialist", "priority": "High"},
-    "gonorrhea": {"M": [0, 0], "F": [0, 0], "unit": "Binary", "category": "Infectious Disease", "specialist": "Sexual Medicine Specialist", "priority": "High"},
-    "syphilis": {"M": [0, 1.0], "F": [0, 1.0], "unit": "Index/Titer", "category": "Infectious Disease", "specialist": "Infectious Disease Specialist", "priority": "High"},
-    "hsv 1": {"M": [0, 0.9], "F": [0, 0.9], "unit": "Index", "category": "Infectious Disease", "specialist": "Infectious Disease Specialist", "priority": "Medium"},
-    "hsv 2": {"M": [0, 0.9], "F": [0, 0.9], "unit": "Index", "category": "Infectious Disease", "specialist": "Infectious Disease Specialist", "priority": "Medium"},
-
-    # 🧠 NEUROLOGICAL (151-170)
-    "csf glucose": {"M": [40, 70], "F": [40, 70], "unit": "mg/dL", "category": "Neurological", "specialist": "Neurologist", "priority": "High"},
-    "csf protein": {"M": [15, 45], "F": [15, 45], "unit": "mg/dL", "category": "Neurological", "specialist": "Neurologist", "priority": "High"},
-    "tau protein": {"M": [0, 300], "F": [0, 300], "unit": "pg/mL", "category": "Neurological", "specialist": "Geriatric Specialist", "priority": "High", "purpose": "Alzheimer marker."},
-    "amyloid beta": {"M": [500, 1500], "F": [500, 1500], "unit": "pg/mL", "category": "Neurological", "specialist": "Neurologist", "priority": "High"},
-    "nse": {"M": [0, 16.3], "F": [0, 16.3], "unit": "ng/mL", "category": "Neurological", "specialist": "Oncologist", "priority": "Medium", "purpose": "Neuron Specific Enolase."},
-    "myelin basic protein": {"M": [0, 4.0], "F": [0, 4.0], "unit": "ng/mL", "category": "Neurological", "specialist": "Neurologist", "priority": "High"},
-
-    # 🧬 GENETIC & ONCOLOGY (171-190)
-    "psa": {"M": [0, 4.0], "F": [0, 0], "unit": "ng/mL", "category": "Oncology", "specialist": "Urologist", "priority": "High"},
-    "ca-125": {"M": [0, 35], "F": [0, 35], "unit": "U/mL", "category": "Oncology", "specialist": "Gynecologist", "priority": "High"},
-    "cea": {"M": [0, 3.0], "F": [0, 3.0], "unit": "ng/mL", "category": "Oncology", "specialist": "Oncologist", "priority": "High"},
-    "afp": {"M": [0, 8.0], "F": [0, 8.0], "unit": "ng/mL", "category": "Oncology", "specialist": "Hepatologist", "priority": "High"},
-    "brca1": {"M": [0, 0], "F": [0, 0], "unit": "Binary", "category": "Genetics", "specialist": "Clinical Geneticist", "priority": "High"},
-    "brca2": {"M": [0, 0], "F": [0, 0], "unit": "Binary", "category": "Genetics", "specialist": "Clinical Geneticist", "priority": "High"},
-    "kras mutation": {"M": [0, 0], "F": [0, 0], "unit": "Binary", "category": "Genetics", "specialist": "Molecular Pathologist", "priority": "High"},
-    "nras mutation": {"M": [0, 0], "F": [0, 0], "unit": "Binary", "category": "Genetics", "specialist": "Molecular Pathologist", "priority": "High"},
-    "tp53": {"M": [0, 0], "F": [0, 0], "unit": "Binary", "category": "Genetics", "specialist": "Molecular Pathologist", "priority": "High"},
-    "egfr mutation": {"M": [0, 0], "F": [0, 0], "unit": "Binary", "category": "Genetics", "specialist": "Pulmonary Critical Care Specialist", "priority": "High"},
-    "her2/neu": {"M": [0, 1.0], "F": [0, 1.0], "unit": "Index", "category": "Oncology", "specialist": "Breast Cancer Surgeon", "priority": "High"},
-
-    # 🥚 REPRODUCTIVE & FERTILITY (191-205)
-    "amh": {"M": [0.7, 7.0], "F": [0.7, 7.0], "unit": "ng/mL", "category": "Fertility", "specialist": "IVF & Fertility Consultant", "priority": "Medium", "purpose": "Anti-Mullerian Hormone."},
-    "fsh": {"M": [1.5, 12.4], "F": [4.7, 21.5], "unit": "mIU/mL", "category": "Fertility", "specialist": "Reproductive Endocrinologist", "priority": "Medium"},
-    "lh": {"M": [1.7, 8.6], "F": [2.4, 12.6], "unit": "mIU/mL", "category": "Fertility", "specialist": "Reproductive Endocrinologist", "priority": "Medium"},
-    "progesterone": {"M": [0, 1.0], "F": [0.1, 25.0], "unit": "ng/mL", "category": "Fertility", "specialist": "Obstetrician (OB/GYN)", "priority": "Medium"},
-    "estradiol": {"M": [10, 50], "F": [30, 400], "unit": "pg/mL", "category": "Fertility", "specialist": "Gynecologist", "priority": "Medium"},
-    "shbg": {"M": [10, 80], "F": [20, 130], "unit": "nmol/L", "category": "Fertility", "specialist": "Andrologist", "priority": "Routine"},
-
-    # 👶 PEDIATRIC & NEONATAL (206-215)
-    "newborn screening": {"M": [0, 0], "F": [0, 0], "unit": "Binary", "category": "Pediatric", "specialist": "Neonatal Intensivist", "priority": "High"},
-    "g6pd": {"M": [7.0, 20.5], "F": [7.0, 20.5], "unit": "U/g Hb", "category": "Pediatric", "specialist": "Pediatric Hematologist", "priority": "High"},
-    "pku": {"M": [0, 2.0], "F": [0, 2.0], "unit": "mg/dL", "category": "Pediatric", "specialist": "Clinical Geneticist", "priority": "High"},
-    "neonatal bilirubin": {"M": [0.1, 12.0], "F": [0.1, 12.0], "unit": "mg/dL", "category": "Pediatric", "specialist": "Neonatologist", "priority": "High"},
-    "irt": {"M": [0, 70], "F": [0, 70], "unit": "ng/mL", "category": "Pediatric", "specialist": "Pediatric Endocrinologist", "priority": "High", "purpose": "Cystic Fibrosis screening."},
+try:
+    import numpy as np
+except ImportError:  # classify_batch falls back to a per-row loop
+    np = None
+
+
+# --- REFERENCE DATA ---
+# Ranges live in reference_ranges.json (REFERENCE_RANGES_FILE) with a version
+# stamp that is recorded on every scored report, so rescore.py can pick out
+# reports scored against older ranges.
+
+REFERENCE_RANGES_FILE = os.getenv(
+    "REFERENCE_RANGES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_ranges.json")
+)
+
+
+class ReferenceEntry:
+    """
+    One test's reference data. Slots keep the ~110 entries compact; get()
+    and [] keep the dict-style access ("M", "unit", "specialist", ...).
+    """
+    __slots__ = ("key", "M", "F", "unit", "category", "specialist", "priority", "purpose")
+
+    def __init__(self, key, data):
+        self.key = key
+        self.M = tuple(data["M"])
+        self.F = tuple(data["F"])
+        self.unit = data.get("unit", "")
+        self.category = data.get("category")
+        self.specialist = data.get("specialist")
+        self.priority = data.get("priority")
+        self.purpose = data.get("purpose")
+
+    def bounds(self, sex):
+        """(low, high) for "M" or "F"; the old [0, 1000] default for anything else."""
+        if sex == "M":
+            return self.M
+        if sex == "F":
+            return self.F
+        return (0, 1000)
+
+    def get(self, field, default=None):
+        if field == "key" or field not in self.__slots__:
+            return default
+        value = getattr(self, field)
+        return default if value is None else value
+
+    def __getitem__(self, field):
+        value = self.get(field)
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def __repr__(self):
+        return f"ReferenceEntry({self.key!r}, M={self.M}, F={self.F}, unit={self.unit!r})"
+
+
+def load_reference_ranges(path=REFERENCE_RANGES_FILE):
+    """Returns: (version, {canonical key: ReferenceEntry}) in file order."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return str(data["version"]), {key: ReferenceEntry(key, entry) for key, entry in data["tests"].items()}
+
+REFERENCE_VERSION, MASTER_REFERENCE_DICTIONARY = load_reference_ranges()
+
+# Common report spellings -> canonical dictionary key. Matched against the
+# whole name (punctuation folded, serum/plasma prefixes dropped) and the name
+# without its parenthetical; the parenthetical itself is only tried when
+# substring matching finds nothing.
+TEST_NAME_ALIASES = {
+    "hb": "hemoglobin",
+    "hgb": "hemoglobin",
+    "glycated hemoglobin": "hba1c",
+    "glycated haemoglobin": "hba1c",
+    "glycosylated hemoglobin": "hba1c",
+    "glycosylated haemoglobin": "hba1c",
+    "a1c": "hba1c",
+    "hct": "hematocrit",
+    "tlc": "wbc",
+    "total leucocyte count": "wbc",
+    "total leukocyte count": "wbc",
+    "white blood cell count": "wbc",
+    "red blood cell count": "rbc",
+    "plt": "platelet",
+    "erythrocyte sedimentation rate": "esr",
+    "glucose fasting": "fasting glucose",
+    "fbs": "fasting glucose",
+    "fasting blood sugar": "fasting glucose",
+    "glucose random": "random glucose",
+    "rbs": "random glucose",
+    "random blood sugar": "random glucose",
+    "ppbs": "random glucose",
+    "sgot": "ast",
+    "sgpt": "alt",
+    "alkaline phosphatase": "alp",
+    "gamma gt": "ggt",
+    "lactate dehydrogenase": "ldh",
+    "blood urea nitrogen": "bun",
+    "rheumatoid factor": "rf",
+    "prostate specific antigen": "psa",
+    "carcinoembryonic antigen": "cea",
+    "alpha fetoprotein": "afp",
 }
 
+# Bounded cache of raw name -> resolution (env: TEST_NAME_CACHE_SIZE)
+TEST_NAME_CACHE_SIZE = int(os.getenv("TEST_NAME_CACHE_SIZE", 4096))
+
+
+# --- COMPILED MATCHER ---
+# Every dictionary key and weighted risk-rule term goes into one alternation,
+# longest term first, wrapped in a lookahead so finditer reports the longest
+# term starting at *each* position (overlapping matches) in a single C-level
+# scan. Resolution rules: the longest matching key wins ("mchc" over "mch",
+# "csf glucose" over "glucose"); equal lengths fall back to dictionary order.
+# A name's rule weight is the highest weight among the terms it contains.
+
+RISK_RULES = RiskRules()
+
+def _compile_matcher(dictionary, weights):
+    order = {key: i for i, key in enumerate(dictionary)}
+    terms = sorted(set(dictionary) | set(weights), key=lambda t: (-len(t), t))
+    pattern = re.compile("(?=(" + "|".join(re.escape(t) for t in terms) + "))")
+
+    # A term found at some position shadows every shorter term that is its
+    # prefix, so each term carries the best key and weight among those.
+    term_info = {}
+    for term in terms:
+        prefixes = [term[:n] for n in range(1, len(term) + 1)]
+        keys = [p for p in prefixes if p in order]
+        best = max(keys, key=lambda k: (len(k), -order[k])) if keys else None
+        rank = (len(best), -order[best]) if best else None
+        weight = max((weights[p] for p in prefixes if p in weights), default=0.0)
+        term_info[term] = (rank, best, weight)
+    return pattern, term_info
+
+# (pattern, term_info, rules it was built for); swapped as one tuple on reload
+_initial_rules = RISK_RULES.current()
+_MATCHER = _compile_matcher(MASTER_REFERENCE_DICTIONARY, _initial_rules.weights) + (_initial_rules,)
+_matcher_lock = threading.Lock()
+
+def _use_rules(rules):
+    """Recompile the matcher when hot-reloaded rules change the weighted terms."""
+    global _MATCHER
+    if _MATCHER[2] is rules:
+        return
+    with _matcher_lock:
+        if _MATCHER[2] is rules:
+            return
+        if rules.weights == _MATCHER[2].weights:
+            _MATCHER = _MATCHER[:2] + (rules,)
+            return
+        _MATCHER = _compile_matcher(MASTER_REFERENCE_DICTIONARY, rules.weights) + (rules,)
+        resolve_test_name.cache_clear()
+
+
+def normalize_test_name(test_name):
+    return str(test_name).lower().replace("(f)", "fasting").replace("(pp)", "random")
+
+def _alias_form(text):
+    words = re.sub(r"[^a-z0-9]+", " ", text).split()
+    if words and words[0] in ("serum", "sr", "s", "plasma"):
+        words = words[1:]
+    return " ".join(words)
+
+_ALIASES = {_alias_form(alias): key for alias, key in TEST_NAME_ALIASES.items()}
+
+def _scan_reference(name_key):
+    """Single regex pass: (best key or None, rule weight)."""
+    pattern, term_info, _ = _MATCHER
+    best_rank, best_key, weight = None, None, 0.0
+    for match in pattern.finditer(name_key):
+        rank, key, term_weight = term_info[match.group(1)]
+        if term_weight > weight:
+            weight = term_weight
+        if key is not None and (best_rank is None or rank > best_rank):
+            best_rank, best_key = rank, key
+    return best_key, weight
+
+@lru_cache(maxsize=TEST_NAME_CACHE_SIZE)
+def resolve_test_name(test_name):
+    """
+    Maps a raw test name to its canonical dictionary key, memoized so a
+    repeated name costs one cache lookup.
+    Returns: (canonical key or None, risk-rule weight of the name)
+    """
+    name_key = normalize_test_name(test_name)
+    key, weight = _scan_reference(name_key)
+
+    candidates = [name_key, re.sub(r"\([^)]*\)", " ", name_key)]
+    if key is None:
+        # "Total Count (TLC)": only trust the parenthetical when nothing else matched
+        candidates += re.findall(r"\(([^)]*)\)", name_key)
+    for candidate in candidates:
+        alias = _ALIASES.get(_alias_form(candidate))
+        if alias:
+            return alias, max(weight, _scan_reference(alias)[1])
+    return key, weight
+
+def canonical_test_name(test_name):
+    """Canonical MASTER_REFERENCE_DICTIONARY key for a raw name, or None."""
+    return resolve_test_name(str(test_name))[0]
+
+def resolver_stats():
+    """Hit/miss counters for the test-name cache."""
+    info = resolve_test_name.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hitRate": info.hits / lookups if lookups else 0.0,
+        "size": info.currsize,
+        "maxSize": info.maxsize,
+    }
+
+def match_reference(test_name):
+    """
+    Resolves a test name to its reference entry.
+    Returns: (reference key or None, reference entry or None, risk-rule weight)
+    """
+    key, weight = resolve_test_name(str(test_name))
+    ref = MASTER_REFERENCE_DICTIONARY[key] if key else None
+    return key, ref, weight
+
+# --- UNIT CONVERSION ---
+# Values reported in a different unit than the reference entry are converted
+# with a precomputed (scale, offset) per (canonical key, normalized unit).
+# Unit families give every pure rescaling; analyte-specific entries cover
+# molar units and other conversions that depend on the substance.
+
+_UNIT_REWRITES = [
+    (re.compile(r"[µμ]"), "u"),
+    (re.compile(r"\s+"), ""),
+    (re.compile(r"^[x*×]|(?<=[^0-9])[x*×](?=10)"), ""),
+    (re.compile(r"10[*e](?=\d)"), "10^"),
+    (re.compile(r"mc(?=l|g|mol)"), "u"),
+    (re.compile(r"cu\.?mm|cmm|mm\^?3|ul3"), "ul"),
+    (re.compile(r"^cells/|^cell/"), "/"),
+    (re.compile(r"^(k|thou|thousand)/ul$"), "10^3/ul"),
+    (re.compile(r"^(m|mill|million|millions)/ul$"), "10^6/ul"),
+    (re.compile(r"^lakhs/"), "lakh/"),
+    (re.compile(r"^gms?(?=/|%)"), "g"),
+    (re.compile(r"^(m?g)%$"), r"\1/dl"),
+    (re.compile(r"/hr$|/hour$"), "/h"),
+]
+
+# unit -> multiplier to the family's base unit
+UNIT_FAMILIES = [
+    {"/ul": 1, "10^3/ul": 1e3, "10^9/l": 1e3, "lakh/ul": 1e5, "10^6/ul": 1e6, "10^12/l": 1e6},
+    {"g/dl": 10, "g/l": 1, "mg/dl": 1e-2, "mg/l": 1e-3, "ug/ml": 1e-3, "ug/dl": 1e-5,
+     "ug/l": 1e-6, "ng/ml": 1e-6, "ng/dl": 1e-8, "pg/ml": 1e-9, "ng/l": 1e-9},
+    {"u/l": 1, "iu/l": 1, "ukat/l": 60},
+    {"iu/ml": 1, "u/ml": 1, "miu/ml": 1e-3, "miu/l": 1e-6, "uiu/ml": 1e-6},
+    {"mmol/l": 1e6, "umol/l": 1e3, "nmol/l": 1, "pmol/l": 1e-3},
+    {"mm/h": 1},
+    {"fl": 1, "um3": 1},
+]
+
+# (canonical key, unit) -> (scale, offset) into the reference unit
+ANALYTE_UNIT_CONVERSIONS = {
+    ("glucose", "mmol/l"): (18.016, 0.0),
+    ("fasting glucose", "mmol/l"): (18.016, 0.0),
+    ("random glucose", "mmol/l"): (18.016, 0.0),
+    ("csf glucose", "mmol/l"): (18.016, 0.0),
+    ("creatinine", "umol/l"): (1 / 88.42, 0.0),
+    ("urea", "mmol/l"): (6.006, 0.0),
+    ("bun", "mmol/l"): (2.801, 0.0),
+    ("uric acid", "umol/l"): (1 / 59.48, 0.0),
+    ("total bilirubin", "umol/l"): (1 / 17.1, 0.0),
+    ("direct bilirubin", "umol/l"): (1 / 17.1, 0.0),
+    ("neonatal bilirubin", "umol/l"): (1 / 17.1, 0.0),
+    ("hemoglobin", "mmol/l"): (1.611, 0.0),
+    ("haemoglobin", "mmol/l"): (1.611, 0.0),
+    ("hematocrit", "l/l"): (100.0, 0.0),
+    ("pcv", "l/l"): (100.0, 0.0),
+    ("hba1c", "mmol/mol"): (0.0915, 2.15),  # IFCC -> NGSP
+    ("insulin", "pmol/l"): (1 / 6.945, 0.0),
+    ("c-peptide", "nmol/l"): (3.02, 0.0),
+    ("estradiol", "pmol/l"): (0.2724, 0.0),
+    ("progesterone", "nmol/l"): (1 / 3.18, 0.0),
+    ("amh", "pmol/l"): (1 / 7.14, 0.0),
+}
+
+@lru_cache(maxsize=1024)
+def normalize_unit(unit):
+    """Folds unit spellings: "x10^3/µL", "K/uL" and "thou/cumm" are all "10^3/ul"."""
+    unit = str(unit).strip().lower()
+    for pattern, replacement in _UNIT_REWRITES:
+        unit = pattern.sub(replacement, unit)
+    return unit
+
+def _build_unit_conversions(dictionary):
+    conversions = {}
+    for key, ref in dictionary.items():
+        ref_unit = normalize_unit(ref.unit)
+        if not ref_unit:
+            continue
+        conversions[(key, ref_unit)] = (1.0, 0.0)
+        for family in UNIT_FAMILIES:
+            if ref_unit in family:
+                for unit, base in family.items():
+                    conversions[(key, unit)] = (base / family[ref_unit], 0.0)
+                break
+    conversions.update(ANALYTE_UNIT_CONVERSIONS)
+    return conversions
+
+UNIT_CONVERSIONS = _build_unit_conversions(MASTER_REFERENCE_DICTIONARY)
+
+def unit_conversion(key, unit):
+    """(scale, offset) from `unit` into the reference unit of `key`, or None if unknown."""
+    if not key or not unit:
+        return None
+    return UNIT_CONVERSIONS.get((key, normalize_unit(unit)))
+
+def value_conversion(key, val, unit):
+    """
+    unit_conversion for one raw value. clean_value already scales a value
+    written in lakhs ("2.5 lakhs"), so a lakh unit next to it ("lakhs/cumm")
+    only contributes its base unit instead of scaling it a second time.
+    """
+    if not key or not unit:
+        return None
+    unit = normalize_unit(unit)
+    if unit.startswith("lakh/") and type(val) is str and "lakh" in val.lower():
+        unit = unit[len("lakh"):]
+    return UNIT_CONVERSIONS.get((key, unit))
+
+# First unsigned decimal in a value: "<5" -> 5, "10-20" -> 10, "1,200" -> 1200
+_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
 def clean_value(val_str):
     """Extracts numeric value from string, handling 'lakhs' and other notations."""
+    # Fast paths for values that are already clean; both give exactly what
+    # the regex below would (it ignores signs and exponents)
+    value_type = type(val_str)
+    if value_type is int:
+        return float(abs(val_str))
+    if value_type is float:
+        # repr switches to exponent notation outside [1e-4, 1e16)
+        if val_str == 0 or 1e-4 <= abs(val_str) < 1e16:
+            return abs(val_str)
+    elif value_type is str:
+        whole, dot, fraction = val_str.partition(".")
+        if whole.isdecimal() and (not dot or fraction.isdecimal()):
+            return float(val_str)
+
     try:
         val_str = str(val_str).lower().replace(",", "")
-        # Handle 'lakh' (common in Indian reports: 2.48 lakhs = 248,000)
-        multiplier = 1.0
-        if "lakh" in val_str:
-            multiplier = 100000.0
-            val_str = val_str.replace("lakh", "").replace("s", "").strip()
-        
-        match = re.search(r"(\d+(\.\d+)?)", val_str)
-        if match:
-            return float(match.group(1)) * multiplier
-        return None
-    except:
+    except (TypeError, ValueError):
         return None
+    # Handle 'lakh' (common in Indian reports: 2.48 lakhs = 248,000)
+    multiplier = 1.0
+    if "lakh" in val_str:
+        multiplier = 100000.0
+        val_str = val_str.replace("lakh", "").replace("s", "").strip()
+
+    match = _NUMBER_PATTERN.search(val_str)
+    if match:
+        return float(match.group()) * multiplier
+    return None
 
-def get_status(test_name, val, sex="M"):
+def clean_values(values):
+    """
+    clean_value over a whole column. Repeated raw values are parsed once,
+    and numeric NumPy arrays are handled as array operations.
+    Returns: list of floats (None where nothing parses)
+    """
+    if np is not None and isinstance(values, np.ndarray) and (values.dtype.kind in "iu" or values.dtype == np.float64):
+        magnitudes = np.abs(values.astype(float))
+        if values.dtype.kind == "f":
+            plain = (magnitudes == 0) | ((magnitudes >= 1e-4) & (magnitudes < 1e16))
+            if not plain.all():
+                result = magnitudes.tolist()
+                for i in np.flatnonzero(~plain).tolist():
+                    result[i] = clean_value(float(values[i]))
+                return result
+        return magnitudes.tolist()
+
+    parsed = {}
+    result = []
+    for value in values:
+        # Keyed by type too: True == 1 but they parse differently
+        key = (type(value), value)
+        try:
+            number = parsed[key]
+        except KeyError:
+            number = parsed[key] = clean_value(value)
+        except TypeError:  # unhashable
+            number = clean_value(value)
+        result.append(number)
+    return result
+
+def get_status(test_name, val, sex="M", unit=None):
     """
     Compares a test value against the master dictionary.
+    `unit` (as reported) converts the value into the reference unit; without
+    a known unit the magnitude heuristic below is used instead.
     Returns: status, is_abnormal
     """
-    name_key = test_name.lower().replace("(f)", "fasting").replace("(pp)", "random")
-    
-    ref = None
-    for key in MASTER_REFERENCE_DICTIONARY:
-        if key in name_key:
-            ref = MASTER_REFERENCE_DICTIONARY[key]
-            break
-            
+    key, ref, _ = match_reference(test_name)
+    return status_for_reference(ref, val, sex, value_conversion(key, val, unit))
+
+def status_for_reference(ref, val, sex="M", conversion=None):
+    """get_status for an already resolved reference entry and unit conversion."""
     if not ref:
         return "Not Classified", False
 
-    if isinstance(ref, dict):
-        ranges = ref.get(sex, [0, 1000])
-    else:
-        ranges = ref[:2]
+    ranges = ref.bounds(sex)
 
     num_val = clean_value(val)
     if num_val is None:
         return "Invalid Data", False
 
     low, high = ranges
-    
-    # --- AUTO-NORMALIZATION OF MAGNITUDE ---
+
+    if conversion is not None:
+        scale, offset = conversion
+        normalized_val = num_val * scale + offset
+    # --- AUTO-NORMALIZATION OF MAGNITUDE (unit unknown) ---
     # Many labs use /µL (e.g. 9600) while ref uses 10^9/L (9.6)
     # If the value is > 100x the high range, we assume it's in a smaller unit scale
-    if num_val > high * 100:
+    elif num_val > high * 100:
         normalized_val = num_val / 1000.0
     else:
         normalized_val = num_val
@@ -204,78 +446,168 @@ def get_status(test_name, val, sex="M"):
         
     return "Normal", False
 
+# --- BATCH CLASSIFICATION ---
+# Bounds for every reference entry as a (keys, 3, 2) table: columns are M, F
+# and the [0, 1000] default get_status uses for any other sex value. One
+# extra all-NaN row at the end stands in for unclassified names.
+
+STATUS_LABELS = ("Normal", "Borderline", "Low", "High", "Not Classified", "Invalid Data")
+_NORMAL, _BORDERLINE, _LOW, _HIGH, _NOT_CLASSIFIED, _INVALID = range(len(STATUS_LABELS))
+_SEX_COLUMNS = {"M": 0, "F": 1}
+
+_REFERENCE_KEYS = list(MASTER_REFERENCE_DICTIONARY)
+_REFERENCE_INDEX = {key: i for i, key in enumerate(_REFERENCE_KEYS)}
+
+if np is not None:
+    _BOUNDS = np.array(
+        [[MASTER_REFERENCE_DICTIONARY[key].bounds(sex) for sex in ("M", "F", None)]
+         for key in _REFERENCE_KEYS] + [[[np.nan, np.nan]] * 3],
+        dtype=float,
+    )
+
+def classify_batch(names, values, sex="M", units=None):
+    """
+    Columnar get_status for re-scoring many rows at once.
+    `sex` is a single value or one per row; `units` is None or one reported
+    unit per row. Each distinct name and each distinct (name, unit) pair is
+    resolved once and mapped back to its rows; with NumPy the unit
+    conversion and range checks run as array operations.
+    Returns: (statuses, abnormal_flags) as lists
+    """
+    names = list(names)
+    if np is None or not isinstance(values, np.ndarray):
+        values = list(values)
+    if len(names) != len(values):
+        raise ValueError("names and values must have the same length")
+    sexes = [sex] * len(names) if isinstance(sex, str) or sex is None else list(sex)
+    if len(sexes) != len(names):
+        raise ValueError("sex must be a single value or one per row")
+    units = [None] * len(names) if units is None else list(units)
+    if len(units) != len(names):
+        raise ValueError("units must be None or one per row")
+
+    # Reports repeat a few dozen names and units across many rows
+    name_index = {}
+    row_names = [name_index.setdefault(name, len(name_index)) for name in names]
+    distinct_keys = [canonical_test_name(name) for name in name_index]
+    pair_index = {}
+    row_pairs = [pair_index.setdefault(pair, len(pair_index)) for pair in zip(row_names, units)]
+    pair_conversions = [unit_conversion(distinct_keys[n], unit) for n, unit in pair_index]
+    # A lakh unit depends on whether the value itself says lakh, so those rows go one by one
+    lakh_pairs = {p for (_, unit), p in pair_index.items() if unit and normalize_unit(unit).startswith("lakh/")}
+    lakh_rows = [i for i, p in enumerate(row_pairs) if p in lakh_pairs] if lakh_pairs else []
+
+    if np is None:
+        ref_keys = [distinct_keys[n] for n in row_names]
+        conversions = [pair_conversions[p] for p in row_pairs]
+        for i in lakh_rows:
+            conversions[i] = value_conversion(ref_keys[i], values[i], units[i])
+        results = [
+            status_for_reference(MASTER_REFERENCE_DICTIONARY[key] if key else None, val, s, conversion)
+            for key, val, s, conversion in zip(ref_keys, values, sexes, conversions)
+        ]
+        return [r[0] for r in results], [r[1] for r in results]
+
+    unclassified_row = len(_REFERENCE_KEYS)
+    distinct_idx = np.array([_REFERENCE_INDEX[k] if k else unclassified_row for k in distinct_keys], dtype=np.intp)
+    ref_idx = distinct_idx[np.array(row_names, dtype=np.intp)]
+    sex_col = np.array([_SEX_COLUMNS.get(s, 2) for s in sexes], dtype=np.intp)
+    parsed = clean_values(values)
+    nums = np.array([np.nan if v is None else v for v in parsed], dtype=float)
+
+    low = _BOUNDS[ref_idx, sex_col, 0]
+    high = _BOUNDS[ref_idx, sex_col, 1]
+
+    # Known units convert exactly; the rest get get_status's magnitude heuristic
+    pair_factors = np.array([c if c is not None else (np.nan, np.nan) for c in pair_conversions], dtype=float).reshape(-1, 2)
+    factors = pair_factors[np.array(row_pairs, dtype=np.intp)]
+    for i in lakh_rows:
+        conversion = value_conversion(distinct_keys[row_names[i]], values[i], units[i])
+        factors[i] = conversion if conversion is not None else (np.nan, np.nan)
+    scale, offset = factors[:, 0], factors[:, 1]
+    nums = np.where(
+        np.isnan(scale),
+        np.where(nums > high * 100, nums / 1000.0, nums),
+        nums * scale + offset,
+    )
+
+    codes = np.select(
+        [
+            ref_idx == unclassified_row,
+            np.isnan(nums),
+            nums < low,
+            nums > high,
+            (nums <= low * 1.1) | (nums >= high * 0.9),
+        ],
+        [_NOT_CLASSIFIED, _INVALID, _LOW, _HIGH, _BORDERLINE],
+        default=_NORMAL,
+    )
+    abnormal = (codes == _LOW) | (codes == _HIGH) | (codes == _BORDERLINE)
+    labels = np.array(STATUS_LABELS, dtype=object)
+    return labels[codes].tolist(), abnormal.tolist()
+
 def calculate_risk_level(tests_list):
     """
     Analyzes the entire set of tests to determine overall severity.
+    The decision comes from the compiled risk rules (risk_rules.json): each
+    abnormal test adds its rule weight, votes for its specialist by the
+    entry's priority, and the first level whose minimums are met sets the
+    risk and banner.
     """
+    rules = RISK_RULES.current()
+    _use_rules(rules)
+
     processed = []
     abnormal_count = 0
-    severe_flags = []
-    potential_specialists = []
-    
+    max_weight = total_weight = 0.0
+    votes = {}  # specialist -> priority score; dicts keep first-seen order for ties
+
     for test in tests_list:
         name = test.get('name', 'Unknown')
         val = test.get('value', '0')
-        
-        status, is_abnormal = get_status(name, val)
-        
-        # Get metadata if available
-        meta = None
-        for key in MASTER_REFERENCE_DICTIONARY:
-            if key in name.lower():
-                meta = MASTER_REFERENCE_DICTIONARY[key]
-                break
+
+        # One lookup resolves the reference entry, its metadata and rule weight
+        key, meta, weight = match_reference(name)
+        status, is_abnormal = status_for_reference(meta, val, conversion=value_conversion(key, val, test.get('unit')))
 
         if status == "Not Classified":
             status = test.get('status', 'Normal')
             is_abnormal = status.lower() not in ['normal', 'optimal']
-            
+
         test['status'] = status
         processed.append(test)
-        
+
         if is_abnormal:
             abnormal_count += 1
+            weight = weight or rules.default_weight
+            total_weight += weight
+            if weight > max_weight:
+                max_weight = weight
             if meta and meta.get('specialist'):
-                potential_specialists.append(meta['specialist'])
+                specialist = meta['specialist']
+                priority = rules.specialist_priority.get(meta.get('priority'), rules.default_priority)
+                votes[specialist] = votes.get(specialist, 0.0) + priority
 
-            if any(x in name.lower() for x in ['crp', 'creatinine', 'hiv', 'hbsag', 'troponin', 'psa', 'cea']):
-                severe_flags.append(name)
+    # Highest priority score wins; ties go to the specialist seen first
+    recommended_specialist = max(votes, key=votes.get) if votes else rules.default_specialist
 
+    summary = {"recommendedSpecialist": recommended_specialist}
+    summary.update(rules.classify(max_weight, total_weight, abnormal_count))
+    summary["abnormalCount"] = abnormal_count
+    summary["referenceVersion"] = REFERENCE_VERSION
+    summary["rulesVersion"] = rules.version
 
-    # Determine Specialist
-    if potential_specialists:
-        # Pick the most common or first specialist noted for abnormal results
-        recommended_specialist = potential_specialists[0]
-    else:
-        recommended_specialist = "General Physician"
-
-    if len(severe_flags) > 0:
-        overall = "High"
-        msg = "CRITICAL MARKERS DETECTED"
-        color = "red"
-        specialist = recommended_specialist
-    elif abnormal_count >= 3:
-        overall = "Moderate"
-        msg = "MULTIPLE ABNORMALITIES DETECTED"
-        color = "yellow"
-        specialist = recommended_specialist
-    elif abnormal_count > 0:
-        overall = "Moderate"
-        msg = "MINOR DEVIATIONS FOUND"
-        color = "yellow"
-        specialist = recommended_specialist
-    else:
-        overall = "Low"
-        msg = "OPTIMAL HEALTH PROFILE"
-        color = "green"
-        specialist = "General Wellness"
-
-    summary = {
-        "overallRisk": overall,
-        "bannerMessage": msg,
-        "severityBannerColor": color,
-        "recommendedSpecialist": specialist,
-        "abnormalCount": abnormal_count
-    }
-    
     return summary, processed
+
+def apply_ai_risk(risk_summary, ai_risk):
+    """
+    Lets the AI's explicit overall risk take precedence over the computed
+    one, with the banner mapped through the rules' aiRiskBanners table.
+    """
+    if not ai_risk:
+        return risk_summary
+    risk_summary['overallRisk'] = ai_risk
+    banner = RISK_RULES.current().ai_banner(str(ai_risk))
+    if banner:
+        risk_summary.update(banner)
+    return risk_summary
@@ -0,0 +1,117 @@
+"""
+LAB-LENS SQLite Store
+Embedded storage engine for single-node deployments without MongoDB.
+Runs in WAL mode so several gunicorn workers can read while one writes;
+report and user bodies are kept as JSON text next to indexed lookup columns.
+"""
+import json
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id           TEXT PRIMARY KEY,
+    created_at   TEXT,
+    patient_name TEXT,
+    body         TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_reports_patient_name ON reports (patient_name);
+
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    body  TEXT NOT NULL
+);
+"""
+
+
+class SQLiteStore:
+    def __init__(self, path, busy_timeout_ms=5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+
+    def _conn(self):
+        """One connection per thread; sqlite3 connections are not thread-safe."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000.0)
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _report_row(report):
+        patient = report.get('patient') or {}
+        return (
+            str(report.get('id')),
+            report.get('createdAt'),
+            patient.get('name') if isinstance(patient, dict) else None,
+            json.dumps(report, separators=(',', ':')),
+        )
+
+    # --- Reports ---
+
+    def save_report(self, report):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO reports (id, created_at, patient_name, body) VALUES (?, ?, ?, ?)",
+                self._report_row(report),
+            )
+        return True
+
+    def save_reports(self, reports):
+        """Bulk insert in a single transaction (used for one-time imports)."""
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO reports (id, created_at, patient_name, body) VALUES (?, ?, ?, ?)",
+                [self._report_row(r) for r in reports if r.get('id') is not None],
+            )
+        return True
+
+    def get_report(self, report_id):
+        row = self._conn().execute("SELECT body FROM reports WHERE id = ?", (str(report_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete_report(self, report_id):
+        with self._conn() as conn:
+            cursor = conn.execute("DELETE FROM reports WHERE id = ?", (str(report_id),))
+        return cursor.rowcount > 0
+
+    def get_all_reports(self):
+        rows = self._conn().execute("SELECT body FROM reports ORDER BY created_at, id")
+        return [json.loads(body) for (body,) in rows]
+
+    def get_reports_by_patient(self, name):
+        rows = self._conn().execute(
+            "SELECT body FROM reports WHERE patient_name = ? ORDER BY created_at DESC, id DESC", (name,)
+        )
+        return [json.loads(body) for (body,) in rows]
+
+    def count_reports(self):
+        return self._conn().execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    # --- Users ---
+
+    def save_user(self, user):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO users (email, body) VALUES (?, ?) "
+                "ON CONFLICT (email) DO UPDATE SET body = excluded.body",
+                (user.get('email'), json.dumps(user, separators=(',', ':'))),
+            )
+        return True
+
+    def get_user_by_email(self, email):
+        row = self._conn().execute("SELECT body FROM users WHERE email = ?", (email,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_all_users(self):
+        return [json.loads(body) for (body,) in self._conn().execute("SELECT body FROM users")]
+
+    def count_users(self):
+        return self._conn().execute("SELECT COUNT(*) FROM users").fetchone()[0]
@@ -0,0 +1,56 @@
+"""
+LAB-LENS Upload Streaming
+Copies an uploaded file to disk in fixed-size chunks, hashing it and
+enforcing the size limit in the same pass, so a request never holds more
+than one chunk of the upload in memory. The SHA-256 is handed on to the OCR
+cache, which then doesn't have to read the file again.
+"""
+import os
+import mmap
+import hashlib
+
+UPLOAD_DIR = 'uploads'
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", 25)) * 1024 * 1024)
+UPLOAD_CHUNK = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def stream_to_disk(stream, path, max_bytes=MAX_UPLOAD_BYTES, chunk_size=UPLOAD_CHUNK):
+    """
+    Write `stream` to `path` chunk by chunk.
+    Returns: (sha256 hex digest, size in bytes)
+    Raises UploadTooLarge (leaving nothing behind) once max_bytes is exceeded.
+    """
+    h = hashlib.sha256()
+    size = 0
+    tmp_path = f"{path}.part"
+    try:
+        with open(tmp_path, 'wb') as out:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+                h.update(chunk)
+                out.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return h.hexdigest(), size
+
+
+def map_file(path):
+    """
+    Read-only memory map of a file: pages are loaded on demand by the OS and
+    shared between readers instead of copied into each request.
+    The caller closes it.
+    """
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
@@ -0,0 +1,152 @@
+"""
+LAB-LENS Write-Behind Queue
+Buffers MongoDB report inserts off the request path and flushes them with
+insert_many once MONGO_WRITE_BEHIND_BATCH documents are queued or
+MONGO_WRITE_BEHIND_MS has passed. Queued documents stay readable from a
+local cache until their flush lands, and the queue drains on shutdown.
+
+The queue and its cache live in one gunicorn worker: until a report is
+flushed, a request served by another worker won't find it (at most
+MONGO_WRITE_BEHIND_MS, longer while MongoDB is failing). Documents MongoDB
+rejects for good (e.g. validation errors) leave the queue and are handed to
+on_reject so they can't hold up the documents behind them.
+"""
+import os
+import time
+import atexit
+import threading
+from pymongo.errors import BulkWriteError, PyMongoError
+
+MONGO_WRITE_BEHIND = os.getenv("MONGO_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+MONGO_WRITE_BEHIND_BATCH = int(os.getenv("MONGO_WRITE_BEHIND_BATCH", 50))
+MONGO_WRITE_BEHIND_MS = int(os.getenv("MONGO_WRITE_BEHIND_MS", 200))
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindQueue:
+    def __init__(self, collection, max_batch=MONGO_WRITE_BEHIND_BATCH, max_delay_ms=MONGO_WRITE_BEHIND_MS,
+                 key='id', on_reject=None):
+        self.collection = collection
+        self.on_reject = on_reject
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000.0
+        self.key = key
+        self._queue = []        # documents waiting for insert_many
+        self._cache = {}        # key -> document until its flush lands
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self.flushed = 0
+        self.failures = 0
+        self.rejected = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, doc):
+        """Queue a document for insertion. Returns immediately."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            self._queue.append(doc)
+            self._cache[doc.get(self.key)] = doc
+            # Wake the flusher for the first document (starts the max_delay clock) and a full batch
+            if len(self._queue) == 1 or len(self._queue) >= self.max_batch:
+                self._cond.notify()
+        return True
+
+    def get(self, key):
+        """A queued document that has not reached MongoDB yet, or None."""
+        with self._cond:
+            doc = self._cache.get(key)
+        return dict(doc) if doc is not None else None
+
+    def pending(self):
+        with self._cond:
+            return len(self._queue)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._queue:
+                    return
+                # Give the batch up to max_delay to fill
+                deadline = time.monotonic() + self.max_delay
+                while len(self._queue) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            if not self.flush():
+                # Back off before retrying a failed batch
+                time.sleep(min(5.0, self.max_delay * 10))
+
+    def flush(self):
+        """
+        Write the batch at the head of the queue. Returns False if it has to
+        be retried (network errors, write concern errors).
+        """
+        with self._flush_lock:
+            with self._cond:
+                batch = self._queue[:self.max_batch]
+            if not batch:
+                return True
+
+            written = False
+            rejected = []
+            try:
+                # insert_many adds _id to the documents it is given, so pass copies
+                self.collection.insert_many([dict(d) for d in batch], ordered=False)
+                written = True
+            except BulkWriteError as e:
+                errors = e.details.get('writeErrors', [])
+                # Unordered: everything without a write error was inserted. Documents
+                # already present (e.g. a retried batch) count as written.
+                rejected = [batch[err['index']] for err in errors if err.get('code') != DUPLICATE_KEY]
+                written = not e.details.get('writeConcernErrors')
+                if rejected:
+                    print(f"⚠️ Write-behind rejected {len(rejected)} document(s): {errors[:1]}")
+            except PyMongoError as e:
+                print(f"⚠️ Write-behind insert_many failed: {e}")
+
+            if not written:
+                self.failures += 1
+                return False
+
+            with self._cond:
+                del self._queue[:len(batch)]
+                for doc in batch:
+                    key = doc.get(self.key)
+                    if self._cache.get(key) is doc:
+                        del self._cache[key]
+            self.flushed += len(batch) - len(rejected)
+            self.rejected += len(rejected)
+            for doc in rejected:
+                self._reject(doc)
+            return True
+
+    def _reject(self, doc):
+        if self.on_reject is None:
+            return
+        try:
+            self.on_reject(doc)
+        except Exception as e:
+            print(f"⚠️ Could not keep rejected document {doc.get(self.key)}: {e}")
+
+    def close(self, timeout=10.0):
+        """Stop accepting documents and drain the queue."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            if not self.flush():
+                time.sleep(0.2)
+        if self.pending():
+            print(f"⚠️ Write-behind queue closed with {self.pending()} unflushed report(s)")